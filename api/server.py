@@ -2,15 +2,25 @@
 FastAPI server for Paper2Slides
 """
 
+import os
 import sys
 import uuid
+import hashlib
 import asyncio
+import functools
 import logging
-import socket
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
-
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import aiofiles
+import aiofiles.os
+import orjson
+from cachetools import LRUCache, TTLCache
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
@@ -23,12 +33,9 @@ SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-# Import paper2slides functions
-from paper2slides.core import (
-    run_pipeline, get_base_dir, get_config_dir,
-    get_config_name, detect_start_stage
-)
-from paper2slides.utils.path_utils import get_project_name
+# Import paper2slides functions (the pipeline itself is imported lazily in the handlers)
+from paper2slides.core.paths import get_base_dir, get_config_dir
+from paper2slides.utils.path_utils import get_project_name, parse_style
 from paper2slides.utils import setup_logging
 
 # Configuration - use project root directories
@@ -42,12 +49,17 @@ app = FastAPI(title="Paper2Slides API", version="1.0.0")
 # Configure logging for paper2slides
 setup_logging(level=logging.INFO)
 
+# Maximum number of cancelled session IDs remembered by SessionManager
+MAX_CANCELLED_SESSIONS = 1024
+
+
 # Global state for tracking running sessions
 class SessionManager:
     def __init__(self):
         self.running_session = None
-        self.cancelled_sessions = set()  # Track cancelled session IDs
-        self.lock = asyncio.Lock()
+        self.cancelled_sessions = OrderedDict()  # Track cancelled session IDs, oldest first
+        self.lock = asyncio.Lock()  # Guards running_session compare-and-set
+        self.short_ids = {}  # Session ID -> short form used in log lines
     
     async def start_session(self, session_id: str) -> bool:
         """Try to start a new session. Returns False if another session is already running"""
@@ -55,25 +67,29 @@ class SessionManager:
             if self.running_session is not None:
                 return False
             self.running_session = session_id
-            # Remove from cancelled set when starting (for regeneration cases)
-            self.cancelled_sessions.discard(session_id)
-            return True
+        self.short_ids[session_id] = session_id[:8]
+        # Remove from cancelled set when starting (for regeneration cases)
+        self.cancelled_sessions.pop(session_id, None)
+        return True
     
     async def end_session(self, session_id: str):
         """End a session"""
         async with self.lock:
             if self.running_session == session_id:
                 self.running_session = None
-            # Keep cancelled flag for a bit, clean up later if needed
+        self.short_ids.pop(session_id, None)
+        # Keep cancelled flags for a bit, evicting the oldest beyond the cap
+        while len(self.cancelled_sessions) > MAX_CANCELLED_SESSIONS:
+            self.cancelled_sessions.popitem(last=False)
     
     async def cancel_session(self, session_id: str) -> bool:
         """Cancel a running session. Returns True if session was running"""
-        async with self.lock:
-            if self.running_session == session_id:
-                self.cancelled_sessions.add(session_id)
-                logger.info(f"Session {session_id[:8]} marked for cancellation")
-                return True
-            return False
+        # No await between the check and the write, so this is atomic on the loop
+        if self.running_session == session_id:
+            self.cancelled_sessions[session_id] = None
+            logger.info(f"Session {self.short(session_id)} marked for cancellation")
+            return True
+        return False
     
     def is_cancelled(self, session_id: str) -> bool:
         """Check if a session has been cancelled"""
@@ -82,9 +98,167 @@ class SessionManager:
     def get_running_session(self) -> Optional[str]:
         """Get the currently running session ID"""
         return self.running_session
+    
+    def short(self, session_id: str) -> str:
+        """Short session ID for log and status messages"""
+        return self.short_ids.get(session_id) or session_id[:8]
 
 session_manager = SessionManager()
 
+# Session ID -> state.json path, recorded when a pipeline starts so status
+# polls don't have to walk the output tree
+app.state.session_index = {}
+
+# Session ID -> paths/config of the running pipeline, reused by error handling
+app.state.session_ctx = {}
+
+# Finished pipeline results, evicted after RESULTS_TTL seconds or beyond
+# RESULTS_MAX_SESSIONS entries
+RESULTS_MAX_SESSIONS = 512
+RESULTS_TTL = 3600
+app.state.results = TTLCache(maxsize=RESULTS_MAX_SESSIONS, ttl=RESULTS_TTL)
+_results_lock = threading.Lock()
+
+# Pipelines run in a dedicated thread with their own event loop, so blocking
+# work in the stages never competes with request handling. SessionManager
+# only allows one running session, so a single worker is enough.
+app.state.pipeline_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline")
+
+
+def _store_result(session_id: str, result: dict):
+    """Record the outcome of a background pipeline run"""
+    with _results_lock:
+        app.state.results[session_id] = result
+
+
+# Append-only log of pipeline starts, replayed at startup so the session index
+# survives restarts. Compacted to live sessions once it grows past the limit.
+MANIFEST_PATH = OUTPUT_DIR / "_manifest.jsonl"
+MANIFEST_MAX_LINES = 10000
+_manifest_entries = {}  # Session ID -> latest manifest entry
+_manifest_lines = 0
+_manifest_lock = threading.Lock()
+
+
+def _compact_manifest():
+    """Rewrite the manifest with the latest entry of each session that still has a state file"""
+    global _manifest_lines
+    live = {
+        sid: entry for sid, entry in _manifest_entries.items()
+        if (Path(entry["config_dir"]) / "state.json").exists()
+    }
+    tmp_path = MANIFEST_PATH.with_suffix(".jsonl.tmp")
+    tmp_path.write_bytes(b"".join(orjson.dumps(entry) + b"\n" for entry in live.values()))
+    os.replace(tmp_path, MANIFEST_PATH)
+    _manifest_entries.clear()
+    _manifest_entries.update(live)
+    _manifest_lines = len(live)
+
+
+def _load_manifest():
+    """Populate the session index from the manifest"""
+    global _manifest_lines
+    if not MANIFEST_PATH.exists():
+        return
+    with _manifest_lock:
+        data = MANIFEST_PATH.read_bytes()
+        for line in data.splitlines():
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # Torn write from a crash
+            _manifest_entries[entry["session_id"]] = entry
+            _manifest_lines += 1
+        # Also rewrite after a torn last line so the next append starts cleanly
+        if _manifest_lines > MANIFEST_MAX_LINES or (data and not data.endswith(b"\n")):
+            _compact_manifest()
+        for sid, entry in _manifest_entries.items():
+            app.state.session_index[sid] = Path(entry["config_dir"]) / "state.json"
+
+
+def _append_manifest(entry: dict):
+    """Record a pipeline start in the manifest"""
+    global _manifest_lines
+    with _manifest_lock:
+        with open(MANIFEST_PATH, "ab") as f:
+            f.write(orjson.dumps(entry) + b"\n")
+        _manifest_entries[entry["session_id"]] = entry
+        _manifest_lines += 1
+        if _manifest_lines > MANIFEST_MAX_LINES:
+            _compact_manifest()
+
+
+_load_manifest()
+
+
+# Parsed state.json files keyed by path, reused while the file is unchanged;
+# least recently polled files are dropped beyond STATE_CACHE_MAX_FILES
+STATE_CACHE_MAX_FILES = 256
+_state_cache = LRUCache(maxsize=STATE_CACHE_MAX_FILES)
+
+
+async def _read_state_file(state_file_path: Path) -> dict:
+    """Load a state.json file, reusing the cached parse if it hasn't changed"""
+    # mtime alone can miss back-to-back writes on coarse-mtime filesystems; state
+    # is replaced atomically, so a new inode also marks every write
+    st = await aiofiles.os.stat(state_file_path)
+    version = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _state_cache.get(state_file_path)
+    if cached and cached[0] == version:
+        return cached[1]
+    async with aiofiles.open(state_file_path, 'rb') as f:
+        data = orjson.loads(await f.read())
+    _state_cache[state_file_path] = (version, data)
+    return data
+
+
+async def _lookup_indexed_state(session_id: str) -> Optional[dict]:
+    """Return the state for a session via the in-memory index, if known"""
+    state_file_path = app.state.session_index.get(session_id)
+    if state_file_path is None:
+        return None
+    try:
+        return await _read_state_file(state_file_path)
+    except FileNotFoundError:
+        app.state.session_index.pop(session_id, None)
+    except Exception as e:
+        logger.warning(f"Error reading state file {state_file_path}: {e}")
+    return None
+
+
+async def _scan_state_files(session_id: str, project_name: str) -> Optional[dict]:
+    """Find the state for a session by reading the project's state.json files concurrently"""
+    # Look for all state.json files under both paper and general content types
+    candidates = [
+        state_file_path
+        for content_type in ["paper", "general"]
+        for state_file_path in Path(get_base_dir(str(OUTPUT_DIR), project_name, content_type)).rglob("state.json")
+        if state_file_path.is_file()
+    ]
+    loaded = await asyncio.gather(*map(_read_state_file, candidates), return_exceptions=True)
+    
+    state_data = None
+    most_recent_time = None
+    for state_file_path, current_state in zip(candidates, loaded):
+        if isinstance(current_state, Exception):
+            logger.warning(f"Error reading state file {state_file_path}: {current_state}")
+            continue
+        
+        # First priority: exact match by session_id
+        if current_state.get("session_id") == session_id:
+            app.state.session_index[session_id] = state_file_path
+            logger.debug(f"Found exact session match: {state_file_path}")
+            return current_state
+        
+        # Second priority: most recently updated (fallback for old state files)
+        updated_at = current_state.get("updated_at") or current_state.get("created_at")
+        if updated_at and (most_recent_time is None or updated_at > most_recent_time):
+            most_recent_time = updated_at
+            state_data = current_state
+    
+    return state_data
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -94,10 +268,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files for serving generated files
-app.mount("/outputs", StaticFiles(directory=str(OUTPUT_DIR)), name="outputs")
-# Mount uploads directory for serving uploaded source files
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+# Behind nginx, set STATIC_ACCEL_REDIRECT=1 to let the proxy send /outputs and
+# /uploads files itself (see DOCKER.md); otherwise serve them from Python
+STATIC_ACCEL_REDIRECT = os.getenv("STATIC_ACCEL_REDIRECT", "").lower() in ("1", "true", "yes")
+
+if STATIC_ACCEL_REDIRECT:
+    def _accel_redirect(internal_prefix: str, path: str) -> Response:
+        """Hand a static file off to the reverse proxy via X-Accel-Redirect"""
+        if ".." in Path(path).parts:
+            raise HTTPException(status_code=400, detail="Invalid file path")
+        return Response(headers={"X-Accel-Redirect": f"{internal_prefix}/{quote(path)}"})
+    
+    @app.get("/outputs/{path:path}")
+    async def serve_output(path: str):
+        """Serve generated file through the reverse proxy"""
+        return _accel_redirect("/_internal_outputs", path)
+    
+    @app.get("/uploads/{path:path}")
+    async def serve_upload(path: str):
+        """Serve uploaded source file through the reverse proxy"""
+        return _accel_redirect("/_internal_uploads", path)
+else:
+    # Mount static files for serving generated files
+    app.mount("/outputs", StaticFiles(directory=str(OUTPUT_DIR)), name="outputs")
+    # Mount uploads directory for serving uploaded source files
+    app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
 
 class ChatResponse(BaseModel):
@@ -134,7 +329,7 @@ async def get_running_session():
     running_session = session_manager.get_running_session()
     return {
         "has_running_session": running_session is not None,
-        "running_session_id": running_session[:8] if running_session else None
+        "running_session_id": session_manager.short(running_session) if running_session else None
     }
 
 
@@ -144,14 +339,47 @@ async def cancel_session(session_id: str):
     try:
         cancelled = await session_manager.cancel_session(session_id)
         if cancelled:
-            return {"message": f"Session {session_id[:8]} cancellation requested", "cancelled": True}
+            return {"message": f"Session {session_manager.short(session_id)} cancellation requested", "cancelled": True}
         else:
-            return {"message": f"Session {session_id[:8]} is not running", "cancelled": False}
+            return {"message": f"Session {session_manager.short(session_id)} is not running", "cancelled": False}
     except Exception as e:
         logger.error(f"Error cancelling session {session_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB chunks
+
+
+async def _save_upload(file: UploadFile, session_dir: Path) -> dict:
+    """Stream one uploaded file into the session directory"""
+    file_path = session_dir / file.filename
+    size = 0
+    # Stream to disk without blocking the event loop
+    async with aiofiles.open(file_path, "wb") as buffer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
+            size += len(chunk)
+    logger.info(f"Saved file: {file_path}")
+    return {
+        "filename": file.filename,
+        "path": str(file_path),
+        "size": size
+    }
+
+
+def _list_session_files(session_dir: Path) -> List[dict]:
+    """Describe the files already stored in a session directory"""
+    return [
+        {
+            "filename": file_path.name,
+            "path": str(file_path),
+            "size": file_path.stat().st_size
+        }
+        for file_path in session_dir.iterdir()
+        if file_path.is_file()
+    ]
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(
     background_tasks: BackgroundTasks,
@@ -193,13 +421,13 @@ async def chat(
             session_dir = UPLOAD_DIR / session_id
             if session_dir.exists():
                 reusing_session = True
-                print(f"Reusing existing session: {session_id[:8]}")
+                logger.info(f"Reusing existing session: {session_manager.short(session_id)}")
                 
                 # Check if this is a different session from the running one
                 if running_session and running_session != session_id:
                     raise HTTPException(
                         status_code=409, 
-                        detail=f"Another session is already running. Please wait for it to complete. Running session: {running_session[:8]}"
+                        detail=f"Another session is already running. Please wait for it to complete. Running session: {session_manager.short(running_session)}"
                     )
             else:
                 raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
@@ -208,7 +436,7 @@ async def chat(
             if running_session:
                 raise HTTPException(
                     status_code=409, 
-                    detail=f"Another session is already running. Please wait for it to complete. Running session: {running_session[:8]}"
+                    detail=f"Another session is already running. Please wait for it to complete. Running session: {session_manager.short(running_session)}"
                 )
             
             session_id = str(uuid.uuid4())
@@ -216,50 +444,33 @@ async def chat(
             session_dir.mkdir(exist_ok=True)
         
         # Save uploaded files or load existing files
-        saved_files = []
         if reusing_session:
             # Load existing files from session directory
-            for file_path in session_dir.iterdir():
-                if file_path.is_file():
-                    saved_files.append({
-                        "filename": file_path.name,
-                        "path": str(file_path),
-                        "size": file_path.stat().st_size
-                    })
-            print(f"Loaded {len(saved_files)} existing file(s) from session")
+            saved_files = await asyncio.to_thread(_list_session_files, session_dir)
+            logger.info(f"Loaded {len(saved_files)} existing file(s) from session")
         else:
-            # Save newly uploaded files
-            for file in files:
-                if file.filename:
-                    file_path = session_dir / file.filename
-                    CHUNK_SIZE = 1024 * 1024  # 1MB chunks
-                    with open(file_path, "wb") as buffer:
-                        while chunk := file.file.read(CHUNK_SIZE):
-                            buffer.write(chunk)
-                    saved_files.append({
-                        "filename": file.filename,
-                        "path": str(file_path),
-                        "size": file_path.stat().st_size
-                    })
-                    print(f"Saved file: {file_path}")
+            # Save newly uploaded files concurrently
+            saved_files = list(await asyncio.gather(
+                *(_save_upload(file, session_dir) for file in files if file.filename)
+            ))
         
         # Parse fast_mode from string to boolean
         fast_mode_bool = fast_mode and fast_mode.lower() == 'true'
         
         # Log received request
-        print(f"\n{'='*60}")
-        print(f"New Request (Session: {session_id[:8]})")
-        print(f"Files: {len(saved_files)} file(s)")
+        logger.info("=" * 60)
+        logger.info(f"New Request (Session: {session_manager.short(session_id)})")
+        logger.info(f"Files: {len(saved_files)} file(s)")
         for f in saved_files:
-            print(f"  - {f['filename']} ({f['size']} bytes)")
-        print(f"Config: {output_type} | {style} | {content}")
+            logger.info(f"  - {f['filename']} ({f['size']} bytes)")
+        logger.info(f"Config: {output_type} | {style} | {content}")
         if length:
-            print(f"  Length: {length}")
+            logger.info(f"  Length: {length}")
         if density:
-            print(f"  Density: {density}")
+            logger.info(f"  Density: {density}")
         if content == 'paper' and fast_mode_bool:
-            print(f"  Fast Mode: enabled")
-        print(f"{'='*60}\n")
+            logger.info("  Fast Mode: enabled")
+        logger.info("=" * 60)
         
         # Prepare initial response with session_id and uploaded files
         response_data = {
@@ -297,10 +508,20 @@ async def chat(
         return JSONResponse(content=response_data)
         
     except Exception as e:
-        print(f"Error processing request: {str(e)}")
+        logger.error(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 
+@functools.lru_cache(maxsize=256)
+def resolve_style(message: Optional[str], style: str) -> Tuple[str, Optional[str]]:
+    """Resolve (style_type, custom_style); message takes priority over style"""
+    if message and message.strip():
+        # If user provided message, use it as custom style description
+        return "custom", message.strip()
+    # Predefined style, or the style parameter as a custom description
+    return parse_style(style)
+
+
 async def generate_slides_with_pipeline(
     session_id: str,
     message: str, 
@@ -335,22 +556,7 @@ async def generate_slides_with_pipeline(
     if not pdf_files:
         raise ValueError("No PDF file found in uploaded files")
     
-    # Parse style and message
-    # Priority: message > style parameter
-    PREDEFINED_STYLES = {"academic", "doraemon"}
-    
-    if message and message.strip():
-        # If user provided message, use it as custom style description
-        style_type = "custom"
-        custom_style = message.strip()
-    elif style.lower() in PREDEFINED_STYLES:
-        # Use predefined style
-        style_type = style.lower()
-        custom_style = None
-    else:
-        # Use style parameter as custom description
-        style_type = "custom"
-        custom_style = style
+    style_type, custom_style = resolve_style(message, style)
     
     # Handle multiple PDFs: all paths in a list
     pdf_paths = [f['path'] for f in pdf_files]
@@ -361,7 +567,7 @@ async def generate_slides_with_pipeline(
         project_name = f"session_{session_id[:8]}"
         # Use session directory as input_path for multiple files
         input_path = str(Path(pdf_paths[0]).parent)
-        print(f"Processing {len(pdf_paths)} PDFs as a single project")
+        logger.info(f"Processing {len(pdf_paths)} PDFs as a single project")
     else:
         # Single PDF: use pdf name
         project_name = get_project_name(pdf_paths[0])
@@ -383,23 +589,31 @@ async def generate_slides_with_pipeline(
     
     base_dir = get_base_dir(str(OUTPUT_DIR), project_name, content)
     config_dir = get_config_dir(base_dir, config)
+    app.state.session_ctx[session_id] = {
+        "project_name": project_name,
+        "base_dir": base_dir,
+        "config_dir": config_dir,
+        "config": config,
+    }
     
-    print(f"\nPipeline Configuration:")
-    print(f"  Project: {project_name}")
-    print(f"  PDFs: {len(pdf_paths)}")
+    logger.info("Pipeline Configuration:")
+    logger.info(f"  Project: {project_name}")
+    logger.info(f"  PDFs: {len(pdf_paths)}")
     for i, path in enumerate(pdf_paths, 1):
-        print(f"    [{i}] {Path(path).name}")
+        logger.info(f"    [{i}] {Path(path).name}")
     if message and message.strip():
-        print(f"  Message: {message}")
-    print(f"  Output: {base_dir}")
-    print(f"  Config: {config_dir.name}")
+        logger.info(f"  Message: {message}")
+    logger.info(f"  Output: {base_dir}")
+    logger.info(f"  Config: {config_dir.name}")
+    
+    from paper2slides.core.state import create_state, save_state, get_state_path, detect_start_stage, STAGES
+    from paper2slides.core.pipeline import run_pipeline
     
     # Detect start stage first
     from_stage = detect_start_stage(base_dir, config_dir, config)
-    print(f"Starting from stage: {from_stage}")
+    logger.info(f"Starting from stage: {from_stage}")
     
     # Create initial state BEFORE starting pipeline
-    from paper2slides.core.state import create_state, save_state, STAGES
     initial_state = create_state(config)
     
     # Add session_id to state for tracking
@@ -411,7 +625,15 @@ async def generate_slides_with_pipeline(
         initial_state["stages"][STAGES[i]] = "completed"
     
     save_state(config_dir, initial_state)
-    print(f"  Initial state saved (starting from {from_stage})")
+    app.state.session_index[session_id] = get_state_path(config_dir)
+    _append_manifest({
+        "session_id": session_id,
+        "config_dir": str(config_dir),
+        "content_type": content,
+        "output_type": output_type,
+        "ts": initial_state["updated_at"],
+    })
+    logger.info(f"  Initial state saved (starting from {from_stage})")
     
     # Run the pipeline (base_dir already handles document grouping)
     # Pass session_manager to enable cancellation checks
@@ -420,12 +642,15 @@ async def generate_slides_with_pipeline(
     # Find generated output
     output_files = []
     if config_dir.exists():
-        # Find latest timestamped directory
-        timestamp_dirs = sorted([d for d in config_dir.iterdir() if d.is_dir()], reverse=True)
-        if timestamp_dirs:
-            latest_output = timestamp_dirs[0]
+        # Find latest timestamped directory (scandir reuses the dirent type, no extra stat)
+        with os.scandir(config_dir) as entries:
+            latest_output = max(
+                (entry.name for entry in entries if entry.is_dir()),
+                default=None,
+            )
+        if latest_output is not None:
             # Collect generated files
-            for file_path in latest_output.iterdir():
+            for file_path in (config_dir / latest_output).iterdir():
                 if file_path.is_file():
                     output_files.append({
                         "filename": file_path.name,
@@ -436,64 +661,32 @@ async def generate_slides_with_pipeline(
     return {
         "output_dir": str(config_dir),
         "output_files": output_files,
-        "num_files": len(output_files)
+        "num_files": len(output_files),
+        "output_type": output_type,
+        "content_type": content,
     }
 
 
-def _update_state_on_error(
-    session_id: str,
-    error_msg: str,
-    files: List[dict],
-    content: str,
-    output_type: str,
-    style: str,
-    length: Optional[str],
-    density: Optional[str],
-    fast_mode: bool
-):
+def _update_state_on_error(session_id: str, error_msg: str, config_dir: Path):
     """Update state.json when background pipeline fails"""
     from paper2slides.core.state import load_state, save_state
-    import json
-    
-    # Find PDF files
-    pdf_files = [f for f in files if f['filename'].lower().endswith('.pdf')]
-    if not pdf_files:
-        return
-    
-    pdf_paths = [f['path'] for f in pdf_files]
-    if len(pdf_paths) > 1:
-        project_name = f"session_{session_id[:8]}"
-    else:
-        project_name = get_project_name(pdf_paths[0])
-    
-    # Determine which stage failed by checking state file
-    base_dir = get_base_dir(str(OUTPUT_DIR), project_name, content)
-    
-    # Build config to find config_dir
-    PREDEFINED_STYLES = {"academic", "doraemon"}
-    style_type = style.lower() if style.lower() in PREDEFINED_STYLES else "custom"
-    
-    config = {
-        "output_type": output_type,
-        "style": style_type,
-        "slides_length": length or "medium",
-        "poster_density": density or "medium",
-        "fast_mode": fast_mode if content == "paper" else False,
-    }
-    
-    config_dir = get_config_dir(base_dir, config)
     
     # Load and update state
     state = load_state(config_dir)
     if state:
         # Find the running stage and mark it as failed
-        for stage_name, stage_status in state.get("stages", {}).items():
-            if stage_status == "running":
-                state["stages"][stage_name] = "failed"
-                break
+        stages = state.get("stages", {})
+        running_stage = next((name for name, status in stages.items() if status == "running"), None)
+        if running_stage:
+            stages[running_stage] = "failed"
         state["error"] = error_msg
         save_state(config_dir, state)
-        logger.info(f"Updated state.json with error for session {session_id[:8]}")
+        logger.info(f"Updated state.json with error for session {session_manager.short(session_id)}")
+
+
+def _run_pipeline_sync(*args) -> dict:
+    """Run generate_slides_with_pipeline to completion on a fresh event loop"""
+    return asyncio.run(generate_slides_with_pipeline(*args))
 
 
 async def run_pipeline_background(
@@ -515,50 +708,52 @@ async def run_pipeline_background(
         # Try to start the session
         can_start = await session_manager.start_session(session_id)
         if not can_start:
-            logger.error(f"Cannot start session {session_id[:8]} - another session is already running")
+            logger.error(f"Cannot start session {session_manager.short(session_id)} - another session is already running")
             # Store error in state
-            if not hasattr(app.state, 'results'):
-                app.state.results = {}
-            app.state.results[session_id] = {"error": "Another session is already running"}
+            _store_result(session_id, {"error": "Another session is already running"})
             return
         
-        logger.info(f"Starting background pipeline for session {session_id[:8]}")
-        result = await generate_slides_with_pipeline(
-            session_id, message, files, content, output_type, style, length, density, fast_mode, session_manager
+        logger.info(f"Starting background pipeline for session {session_manager.short(session_id)}")
+        # Run on the pipeline thread's own event loop so long stages don't stall status polls
+        result = await asyncio.get_running_loop().run_in_executor(
+            app.state.pipeline_executor,
+            functools.partial(
+                _run_pipeline_sync,
+                session_id, message, files, content, output_type, style, length, density, fast_mode, session_manager
+            ),
         )
         
         # Check if cancelled after completion
         if session_manager and session_manager.is_cancelled(session_id):
-            logger.info(f"Session {session_id[:8]} was cancelled")
+            logger.info(f"Session {session_manager.short(session_id)} was cancelled")
             raise Exception("Generation cancelled by user")
         
-        logger.info(f"Background pipeline completed for session {session_id[:8]}")
+        logger.info(f"Background pipeline completed for session {session_manager.short(session_id)}")
         
-        # Store result in a simple cache (in production, use Redis or database)
-        if not hasattr(app.state, 'results'):
-            app.state.results = {}
-        app.state.results[session_id] = result
+        # Store result in a bounded cache (in production, use Redis or database)
+        _store_result(session_id, result)
         
     except Exception as e:
-        logger.error(f"Background pipeline failed for session {session_id[:8]}: {e}", exc_info=True)
+        logger.error(f"Background pipeline failed for session {session_manager.short(session_id)}: {e}", exc_info=True)
         # Store error in state
-        if not hasattr(app.state, 'results'):
-            app.state.results = {}
-        app.state.results[session_id] = {"error": str(e)}
+        _store_result(session_id, {"error": str(e)})
         
         # Also update the state.json file to reflect the failure
-        try:
-            _update_state_on_error(session_id, str(e), files, content, output_type, style, length, density, fast_mode)
-        except Exception as state_err:
-            logger.error(f"Failed to update state file: {state_err}")
+        ctx = app.state.session_ctx.get(session_id)
+        if ctx:
+            try:
+                _update_state_on_error(session_id, str(e), ctx["config_dir"])
+            except Exception as state_err:
+                logger.error(f"Failed to update state file: {state_err}")
     finally:
         # Always end the session when done (success or failure)
+        app.state.session_ctx.pop(session_id, None)
         await session_manager.end_session(session_id)
-        logger.info(f"Session {session_id[:8]} ended")
+        logger.info(f"Session {session_manager.short(session_id)} ended")
 
 
 @app.get("/api/status/{session_id}")
-async def get_status(session_id: str):
+async def get_status(session_id: str, request: Request):
     """Get processing status for a session"""
     try:
         # Find the output directory for this session
@@ -566,56 +761,23 @@ async def get_status(session_id: str):
         if not session_dir.exists():
             raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
         
-        # Get PDF files from session
-        pdf_files = list(session_dir.glob("*.pdf"))
-        if not pdf_files:
-            return {"session_id": session_id, "status": "no_files", "stages": {}}
+        # Fast path: state file recorded when the pipeline started
+        state_data = await _lookup_indexed_state(session_id)
         
-        # Determine project name and paths
-        if len(pdf_files) > 1:
-            project_name = f"session_{session_id[:8]}"
-        else:
-            project_name = get_project_name(str(pdf_files[0]))
-        
-        # Try to find the state file matching session_id
-        from paper2slides.core.paths import get_base_dir
-        import json
-        
-        # Check both paper and general content types
-        state_data = None
-        most_recent_time = None
-        
-        for content_type in ["paper", "general"]:
-            base_dir = Path(get_base_dir(str(OUTPUT_DIR), project_name, content_type))
-            if base_dir.exists():
-                # Look for all state.json files in config directories
-                for state_file_path in base_dir.rglob("state.json"):
-                    if state_file_path.is_file():
-                        try:
-                            with open(state_file_path, 'r') as f:
-                                current_state = json.load(f)
-                            
-                            # First priority: exact match by session_id
-                            if current_state.get("session_id") == session_id:
-                                state_data = current_state
-                                logger.debug(f"Found exact session match: {state_file_path}")
-                                break
-                            
-                            # Second priority: most recently updated (fallback for old state files)
-                            updated_at = current_state.get("updated_at") or current_state.get("created_at")
-                            if updated_at:
-                                if most_recent_time is None or updated_at > most_recent_time:
-                                    most_recent_time = updated_at
-                                    # Only use as fallback if no exact match found
-                                    if state_data is None or state_data.get("session_id") != session_id:
-                                        state_data = current_state
-                        except Exception as e:
-                            logger.warning(f"Error reading state file {state_file_path}: {e}")
-                            continue
-                
-                # If found exact match, stop searching
-                if state_data and state_data.get("session_id") == session_id:
-                    break
+        if state_data is None:
+            # Get PDF files from session
+            pdf_files = list(session_dir.glob("*.pdf"))
+            if not pdf_files:
+                return {"session_id": session_id, "status": "no_files", "stages": {}}
+            
+            # Determine project name and paths
+            if len(pdf_files) > 1:
+                project_name = f"session_{session_id[:8]}"
+            else:
+                project_name = get_project_name(str(pdf_files[0]))
+            
+            # Slow path: walk the project's outputs for a matching state file
+            state_data = await _scan_state_files(session_id, project_name)
         
         if not state_data:
             return {
@@ -639,14 +801,25 @@ async def get_status(session_id: str):
             overall_status = "running"
         else:
             overall_status = "pending"
+        
+        # Polling clients get 304 until the state file changes
+        etag = '"' + hashlib.blake2b(
+            f"{session_id}:{state_data.get('updated_at')}:{overall_status}".encode(),
+            digest_size=8,
+        ).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
 
-        return {
-            "session_id": session_id,
-            "status": overall_status,
-            "stages": stages,
-            "error": state_data.get("error"),
-            "updated_at": state_data.get("updated_at")
-        }
+        return JSONResponse(
+            content={
+                "session_id": session_id,
+                "status": overall_status,
+                "stages": stages,
+                "error": state_data.get("error"),
+                "updated_at": state_data.get("updated_at")
+            },
+            headers={"ETag": etag},
+        )
         
     except Exception as e:
         logger.error(f"Error getting status for session {session_id}: {e}", exc_info=True)
@@ -658,9 +831,8 @@ async def get_result(session_id: str):
     """Get the final result for a completed session"""
     try:
         # Check if result is in cache
-        if hasattr(app.state, 'results') and session_id in app.state.results:
-            result = app.state.results[session_id]
-            
+        result = app.state.results.get(session_id)
+        if result is not None:
             if "error" in result:
                 raise HTTPException(status_code=500, detail=result["error"])
             
@@ -672,33 +844,7 @@ async def get_result(session_id: str):
             # Find image files
             image_files = [f for f in output_files if f['filename'].endswith(('.png', '.jpg', '.jpeg', '.webp'))]
             
-            # Get output_type from state
-            session_dir = UPLOAD_DIR / session_id
-            pdf_files = list(session_dir.glob("*.pdf"))
-            if len(pdf_files) > 1:
-                project_name = f"session_{session_id[:8]}"
-            else:
-                project_name = get_project_name(str(pdf_files[0]))
-            
-            # Try to get output type from state
-            from paper2slides.core.paths import get_base_dir
-            import json
-            
-            output_type = "slides"  # default
-            for content_type in ["paper", "general"]:
-                base_dir = Path(get_base_dir(str(OUTPUT_DIR), project_name, content_type))
-                if base_dir.exists():
-                    for state_file_path in base_dir.rglob("state.json"):
-                        if state_file_path.is_file():
-                            try:
-                                with open(state_file_path, 'r') as f:
-                                    state_data = json.load(f)
-                                    output_type = state_data.get("config", {}).get("output_type", "slides")
-                                    break
-                            except:
-                                pass
-                    if output_type != "slides":
-                        break
+            output_type = result.get("output_type", "slides")
             
             response_data = {
                 "session_id": session_id,
@@ -750,24 +896,21 @@ async def download_file(filepath: str):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid file path")
     
-    if not file_path.exists():
+    # Single stat serves both the existence check and the response headers;
+    # FileResponse hands the path to the server (ASGI pathsend) when supported
+    try:
+        stat_result = file_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     
     return FileResponse(
         path=str(file_path),
         filename=file_path.name,
-        media_type="application/octet-stream"
+        media_type="application/octet-stream",
+        stat_result=stat_result,
     )
 
 
-def _is_port_in_use(port: int) -> bool:
-    """Return True if port already has a listener."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(0.5)
-        # Check 0.0.0.0 and loopback to cover common bindings
-        return s.connect_ex(("0.0.0.0", port)) == 0 or s.connect_ex(("127.0.0.1", port)) == 0
-
-
 if __name__ == "__main__":
     import uvicorn
     import sys
@@ -780,17 +923,20 @@ if __name__ == "__main__":
     print(f"Output directory: {OUTPUT_DIR.absolute()}")
     print(f"Server running on http://0.0.0.0:{port}")
 
-    if _is_port_in_use(port):
-        print(f"Port {port} is already in use. Stop the existing server or choose another port.")
-        sys.exit(1)
+    # Sessions, results and cancellation flags live in process memory, so keep a
+    # single worker unless requests are pinned to workers (e.g. sticky sessions)
+    workers = int(os.getenv("P2S_WORKERS", "1"))
+    limit_concurrency = int(os.getenv("P2S_MAX_CONCURRENCY", "200"))
 
     try:
         uvicorn.run(
-            app,
+            # Multiple workers need an import string; a single worker reuses this module
+            "api.server:app" if workers > 1 else app,
             host="0.0.0.0",
             port=port,
+            workers=workers,
             timeout_keep_alive=300,
-            limit_concurrency=10,
+            limit_concurrency=limit_concurrency,
             limit_max_requests=1000,
         )
     except OSError as exc:
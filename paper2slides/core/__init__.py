@@ -18,7 +18,6 @@ from .state import (
     create_state,
     detect_start_stage,
 )
-from .pipeline import run_pipeline, list_outputs
 
 __all__ = [
     # Path functions
@@ -41,3 +40,11 @@ __all__ = [
     "list_outputs",
 ]
 
+
+def __getattr__(name):
+    # Import the pipeline (and its stages) only when it is actually used,
+    # so path/state helpers stay cheap to import for the API server
+    if name in ("run_pipeline", "list_outputs"):
+        from . import pipeline
+        return getattr(pipeline, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Dict
 
 from ..utils import log_section
+from ..utils.llm_client import close_async_clients
 from .state import STAGES, load_state, save_state, create_state
 from .paths import get_rag_checkpoint, get_summary_checkpoint, get_plan_checkpoint
 from .stages import run_rag_stage, run_summary_stage, run_plan_stage, run_generate_stage
@@ -24,7 +25,14 @@ async def run_pipeline(base_dir: Path, config_dir: Path, config: Dict, from_stag
         session_id: Session ID for cancellation tracking
         session_manager: Session manager to check cancellation status
     """
-    
+    try:
+        await _run_stages(base_dir, config_dir, config, from_stage, session_id, session_manager)
+    finally:
+        # Each run gets its own event loop; close the connection pools opened on it
+        await close_async_clients()
+
+
+async def _run_stages(base_dir: Path, config_dir: Path, config: Dict, from_stage: str, session_id: str, session_manager):
     # Initialize or load state
     state = load_state(config_dir)
     if not state:
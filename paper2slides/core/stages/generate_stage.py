@@ -6,6 +6,10 @@ from pathlib import Path
 from typing import Dict
 
 from ...utils import load_json
+from ...summary import PaperContent, GeneralContent, OriginalElements
+from ...generator import GenerationConfig, GenerationInput
+from ...generator.content_planner import ContentPlan, Section, TableRef, FigureRef
+from ...generator.image_generator import get_image_generator, save_images_as_pdf
 from ..paths import get_summary_checkpoint, get_plan_checkpoint, get_output_dir
 
 logger = logging.getLogger(__name__)
@@ -13,12 +17,6 @@ logger = logging.getLogger(__name__)
 
 async def run_generate_stage(base_dir: Path, config_dir: Path, config: Dict) -> Dict:
     """Stage 4: Generate images."""
-    from paper2slides.summary import PaperContent, GeneralContent, TableInfo, FigureInfo, OriginalElements
-    from paper2slides.generator import GenerationConfig, GenerationInput
-    from paper2slides.generator.config import OutputType, PosterDensity, SlidesLength, StyleType
-    from paper2slides.generator.content_planner import ContentPlan, Section, TableRef, FigureRef
-    from paper2slides.generator.image_generator import ImageGenerator, save_images_as_pdf
-    
     plan_data = load_json(get_plan_checkpoint(config_dir))
     summary_data = load_json(get_summary_checkpoint(base_dir, config))
     if not plan_data or not summary_data:
@@ -27,23 +25,11 @@ async def run_generate_stage(base_dir: Path, config_dir: Path, config: Dict) ->
     content_type = plan_data.get("content_type", "paper")
     
     origin_data = plan_data["origin"]
-    origin = OriginalElements(
-        tables=[TableInfo(
-            table_id=t["id"],
-            caption=t.get("caption", ""),
-            html_content=t.get("html", ""),
-        ) for t in origin_data.get("tables", [])],
-        figures=[FigureInfo(
-            figure_id=f["id"],
-            caption=f.get("caption"),
-            image_path=f.get("path", ""),
-        ) for f in origin_data.get("figures", [])],
-        base_path=origin_data.get("base_path", ""),
-    )
+    origin = OriginalElements.from_dict(origin_data)
     
     plan_dict = plan_data["plan"]
-    tables_index = {t.table_id: t for t in origin.tables}
-    figures_index = {f.figure_id: f for f in origin.figures}
+    tables_index = origin.get_tables_index()
+    figures_index = origin.get_figures_index()
     
     sections = []
     for s in plan_dict.get("sections", []):
@@ -69,13 +55,7 @@ async def run_generate_stage(base_dir: Path, config_dir: Path, config: Dict) ->
     else:
         content = GeneralContent(**summary_data["content"])
     
-    gen_config = GenerationConfig(
-        output_type=OutputType(config.get("output_type", "slides")),
-        poster_density=PosterDensity(config.get("poster_density", "medium")),
-        slides_length=SlidesLength(config.get("slides_length", "medium")),
-        style=StyleType(config.get("style", "academic")),
-        custom_style=config.get("custom_style"),
-    )
+    gen_config = GenerationConfig.from_dict(config)
     gen_input = GenerationInput(config=gen_config, content=content, origin=origin)
     
     logger.info("Generating images...")
@@ -89,13 +69,22 @@ async def run_generate_stage(base_dir: Path, config_dir: Path, config: Dict) ->
     def save_image_callback(img, index, total):
         ext = ext_map.get(img.mime_type, ".png")
         filepath = output_subdir / f"{img.section_id}{ext}"
-        with open(filepath, "wb") as f:
-            f.write(img.image_data)
+        filepath.write_bytes(img.image_data)
         logger.info(f"  [{index+1}/{total}] Saved: {filepath.name}")
     
-    generator = ImageGenerator()
-    max_workers = config.get("max_workers", 1)
-    images = generator.generate(plan, gen_input, max_workers=max_workers, save_callback=save_image_callback)
+    generator = get_image_generator()
+    # Image requests are network-bound, so the API (which doesn't set max_workers) runs several at once
+    max_workers = config.get("max_workers", 8)
+    try:
+        images = await generator.generate_async(
+            plan, gen_input,
+            max_workers=max_workers,
+            save_callback=save_image_callback,
+            use_batch_api=config.get("use_batch_api", False),
+        )
+    finally:
+        # The generator outlives this run's event loop; don't leave its pool open
+        await generator.aclose_async_client()
     logger.info(f"  Generated {len(images)} images")
     
     # Generate PDF for slides
@@ -2,11 +2,14 @@
 Plan Stage - Content planning
 """
 import os
+import asyncio
 import logging
 from pathlib import Path
 from typing import Dict
 
 from ...utils import load_json, save_json
+from ...summary import PaperContent, GeneralContent, OriginalElements
+from ...generator import GenerationConfig, GenerationInput, ContentPlanner
 from ..paths import get_summary_checkpoint, get_plan_checkpoint
 
 logger = logging.getLogger(__name__)
@@ -14,12 +17,6 @@ logger = logging.getLogger(__name__)
 
 async def run_plan_stage(base_dir: Path, config_dir: Path, config: Dict) -> Dict:
     """Stage 3: Plan content sections."""
-    from paper2slides.summary import PaperContent, GeneralContent, TableInfo, FigureInfo, OriginalElements
-    from paper2slides.generator import (
-        GenerationConfig, GenerationInput, ContentPlanner,
-        OutputType, PosterDensity, SlidesLength, StyleType,
-    )
-    
     summary_data = load_json(get_summary_checkpoint(base_dir, config))
     if not summary_data:
         raise ValueError("Missing summary checkpoint.")
@@ -32,27 +29,9 @@ async def run_plan_stage(base_dir: Path, config_dir: Path, config: Dict) -> Dict
         content = GeneralContent(**summary_data["content"])
     
     origin_data = summary_data["origin"]
-    origin = OriginalElements(
-        tables=[TableInfo(
-            table_id=t["id"],
-            caption=t.get("caption", ""),
-            html_content=t.get("html", ""),
-        ) for t in origin_data.get("tables", [])],
-        figures=[FigureInfo(
-            figure_id=f["id"],
-            caption=f.get("caption"),
-            image_path=f.get("path", ""),
-        ) for f in origin_data.get("figures", [])],
-        base_path=origin_data.get("base_path", ""),
-    )
+    origin = OriginalElements.from_dict(origin_data)
     
-    gen_config = GenerationConfig(
-        output_type=OutputType(config.get("output_type", "slides")),
-        poster_density=PosterDensity(config.get("poster_density", "medium")),
-        slides_length=SlidesLength(config.get("slides_length", "medium")),
-        style=StyleType(config.get("style", "academic")),
-        custom_style=config.get("custom_style"),
-    )
+    gen_config = GenerationConfig.from_dict(config)
     
     gen_input = GenerationInput(config=gen_config, content=content, origin=origin)
     
@@ -76,7 +55,8 @@ async def run_plan_stage(base_dir: Path, config_dir: Path, config: Dict) -> Dict
     checkpoint_path = get_plan_checkpoint(config_dir)
     checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
     
-    save_json(checkpoint_path, result)
+    # Encode and write off the event loop
+    await asyncio.to_thread(save_json, checkpoint_path, result)
     logger.info(f"  Saved: {checkpoint_path}")
     return result
 
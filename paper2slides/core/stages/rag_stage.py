@@ -3,118 +3,400 @@ RAG Stage - Document indexing and querying
 """
 import os
 import re
+import gzip
 import base64
+import hashlib
 import logging
+import functools
+import threading
 import asyncio
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import orjson
+
+try:
+    # SIMD base64 (optional); same output as the stdlib encoder, several times faster
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    _b64encode = base64.b64encode
 
 from ...utils import save_json
+from ...utils.llm_client import get_async_llm_client, get_async_http_client
+from ...utils.response_cache import ResponseCache
+from ...generator.rate_limit import parse_duration
 from ..paths import get_rag_checkpoint
 
 logger = logging.getLogger(__name__)
 
 
+_IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp',
+    '.tiff': 'image/tiff',
+    '.tif': 'image/tiff',
+}
+
+
 def _get_image_mime_type(image_path: str) -> str:
     """Get MIME type for image file based on extension"""
-    ext = Path(image_path).suffix.lower()
-    mime_types = {
-        '.jpg': 'image/jpeg',
-        '.jpeg': 'image/jpeg',
-        '.png': 'image/png',
-        '.gif': 'image/gif',
-        '.bmp': 'image/bmp',
-        '.webp': 'image/webp',
-        '.tiff': 'image/tiff',
-        '.tif': 'image/tiff',
-    }
-    return mime_types.get(ext, 'image/jpeg')  # Default to jpeg
+    ext = os.path.splitext(image_path)[1].lower()
+    return _IMAGE_MIME_TYPES.get(ext, 'image/jpeg')  # Default to jpeg
+
+
+# Read size for streaming base64; a multiple of 3 so chunks encode without padding
+_B64_CHUNK_SIZE = 57 * 1024
+
+# Live fast-mode queries: retries and the longest wait between them (seconds)
+_LIVE_QUERY_RETRIES = 2  # same as the OpenAI SDK default
+_LIVE_QUERY_MAX_DELAY = 60.0  # caps Retry-After as well as the backoff
+# Batch API polling (seconds)
+_BATCH_POLL_INTERVAL = 30
+_BATCH_ACTIVE_STATES = frozenset({"validating", "in_progress", "finalizing"})
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_image_digest(image_path: str, mtime_ns: int, size: int) -> str:
+    """SHA-256 of one version of an image file (mtime/size only key the cache)"""
+    digest = hashlib.sha256()
+    with open(image_path, "rb") as image_file:
+        for chunk in iter(lambda: image_file.read(_B64_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_image_data_url(image_path: str, size: int) -> str:
+    """Read an image file and build its base64 data URL"""
+    with open(image_path, "rb") as image_file:
+        if size <= _B64_CHUNK_SIZE:
+            encoded = _b64encode(image_file.read())
+        else:
+            # Encode chunk by chunk so the raw file is never fully in memory
+            encoded = bytearray()
+            for chunk in iter(lambda: image_file.read(_B64_CHUNK_SIZE), b""):
+                encoded += _b64encode(chunk)
+    return f"data:{_get_image_mime_type(image_path)};base64,{encoded.decode('ascii')}"
 
 
-def _encode_image_to_base64(image_path: str) -> str:
-    """Encode image file to base64 string"""
+def _encode_image_part(image_path: str, st: os.stat_result, image_parts: Dict) -> Optional[Dict]:
+    """
+    Build the image_url content part for an image file, encoding each distinct image only once
+    
+    Args:
+        image_path: Image file path
+        st: Stat result of the image file
+        image_parts: (content digest, MIME type) -> part for the document being built;
+            identical images share one part object
+    """
     try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-        return encoded_string
+        # The data URL also carries the MIME type, so it is part of the key
+        key = (_cached_image_digest(image_path, st.st_mtime_ns, st.st_size), _get_image_mime_type(image_path))
+        part = image_parts.get(key)
+        if part is not None:
+            return part
+        
+        part = {
+            "type": "image_url",
+            "image_url": {
+                "url": _read_image_data_url(image_path, st.st_size)
+            }
+        }
+        # Files are processed in parallel threads; dict.setdefault is atomic, so a
+        # race at worst encodes an image twice and keeps the first part
+        return image_parts.setdefault(key, part)
     except Exception as e:
         logger.error(f"Failed to encode image {image_path}: {e}")
-        return ""
+        return None
+
+
+# Match both markdown image syntax and MinerU format
+# Pattern captures the full match and the image path
+_IMAGE_RE = re.compile(
+    r'(!\[.*?\]\((.*?\.(?:jpg|jpeg|png|gif|bmp|webp|tiff|tif))\)|Image Path:\s*([^\r\n]*?\.(?:jpg|jpeg|png|gif|bmp|webp|tiff|tif)))',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _image_match_path(match: re.Match, markdown_base_path: str) -> str:
+    """Resolved file path of an _IMAGE_RE match (from either group 2 or 3)"""
+    image_path = (match.group(2) or match.group(3)).strip()
+    # Handle relative paths
+    if not Path(image_path).is_absolute():
+        image_path = str(Path(markdown_base_path) / image_path)
+    return image_path
 
 
-def _replace_images_with_base64(markdown_content: str, markdown_base_path: str) -> Tuple[List, int]:
+def _replace_images_with_base64(
+    markdown_content: str,
+    markdown_base_path: str,
+    embed_images: bool = True,
+    image_parts: Optional[Dict] = None,
+) -> Tuple[List, int]:
     """
     Replace image references in markdown with base64 encoded images, preserving position
     
     Args:
         markdown_content: Markdown text content
         markdown_base_path: Directory where markdown file is located
+        embed_images: If False, return the markdown as a single text part without touching images
+        image_parts: Encoded parts shared across the document's files (see _encode_image_part)
     """
+    if not embed_images:
+        return [{"type": "text", "text": markdown_content}], 0
+    if image_parts is None:
+        image_parts = {}
+    
     content_parts = []
+    # Text between embedded images is collected here and emitted as a single part
+    text_buf = []
     last_pos = 0
     image_count = 0
     
-    # Match both markdown image syntax and MinerU format
-    # Pattern captures the full match and the image path
-    pattern = r'(!\[.*?\]\((.*?\.(?:jpg|jpeg|png|gif|bmp|webp|tiff|tif))\)|Image Path:\s*([^\r\n]*?\.(?:jpg|jpeg|png|gif|bmp|webp|tiff|tif)))'
+    def flush_text():
+        text = "".join(text_buf)
+        text_buf.clear()
+        if text.strip():
+            content_parts.append({
+                "type": "text",
+                "text": text
+            })
     
-    for match in re.finditer(pattern, markdown_content, re.IGNORECASE | re.DOTALL):
+    for match in _IMAGE_RE.finditer(markdown_content):
         # Add text before this image
-        if match.start() > last_pos:
-            text_part = markdown_content[last_pos:match.start()]
-            if text_part.strip():
-                content_parts.append({
-                    "type": "text",
-                    "text": text_part
-                })
-        
-        # Extract image path (from either group 2 or 3)
-        image_path = match.group(2) if match.group(2) else match.group(3)
-        image_path = image_path.strip()
+        text_buf.append(markdown_content[last_pos:match.start()])
+        last_pos = match.end()
         
-        # Handle relative paths
-        if not Path(image_path).is_absolute():
-            image_path = str(Path(markdown_base_path) / image_path)
+        image_path = _image_match_path(match, markdown_base_path)
         
-        # Try to encode image
-        if Path(image_path).exists():
-            base64_str = _encode_image_to_base64(image_path)
-            if base64_str:
-                mime_type = _get_image_mime_type(image_path)
-                content_parts.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{base64_str}"
-                    }
-                })
-                image_count += 1
-                logger.debug(f"Embedded image at position {match.start()}: {image_path}")
-            else:
-                # If encoding fails, keep original text
-                content_parts.append({
-                    "type": "text",
-                    "text": match.group(0)
-                })
-        else:
+        # Try to encode image; one stat both checks existence and keys the caches
+        try:
+            st = os.stat(image_path)
+        except OSError:
             logger.warning(f"Image not found: {image_path}")
             # Keep original text reference
-            content_parts.append({
-                "type": "text",
-                "text": match.group(0)
-            })
+            text_buf.append(match.group(0))
+            continue
         
-        last_pos = match.end()
+        image_part = _encode_image_part(image_path, st, image_parts)
+        if image_part is None:
+            # If encoding fails, keep original text
+            text_buf.append(match.group(0))
+            continue
+        
+        flush_text()
+        content_parts.append(image_part)
+        image_count += 1
+        logger.debug(f"Embedded image at position {match.start()}: {image_path}")
     
     # Add remaining text after last image
-    if last_pos < len(markdown_content):
-        remaining_text = markdown_content[last_pos:]
-        if remaining_text.strip():
-            content_parts.append({
+    text_buf.append(markdown_content[last_pos:])
+    flush_text()
+    
+    return content_parts, image_count
+
+
+# Top-k retrieval for long documents (fast mode, opt-in via config["retrieve_topk"])
+_EMBEDDING_MODEL = "text-embedding-3-small"
+_RETRIEVAL_CHUNK_CHARS = 4000
+_EMBEDDING_BATCH_SIZE = 256
+_MAX_CACHED_EMBEDDINGS = 8
+
+# Hash of the chunk texts -> normalized chunk embeddings
+_chunk_embeddings: "OrderedDict[str, Any]" = OrderedDict()
+_chunk_embeddings_lock = threading.Lock()
+
+
+def _split_text(text: str, limit: int) -> List[str]:
+    """Split text into pieces of at most limit chars, preferring paragraph breaks"""
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind("\n\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        pieces.append(text[:cut])
+        text = text[cut:]
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _chunk_content_parts(content_parts: List[Dict], chunk_chars: int) -> List[Tuple[str, List[Dict]]]:
+    """Group content parts into (text, parts) windows of about chunk_chars, keeping images with their surrounding text"""
+    chunks = []
+    parts, texts, length = [], [], 0
+    
+    def flush():
+        nonlocal parts, texts, length
+        if parts:
+            chunks.append(("".join(texts), parts))
+        parts, texts, length = [], [], 0
+    
+    for part in content_parts:
+        if part["type"] != "text":
+            parts.append(part)
+            continue
+        for piece in _split_text(part["text"], chunk_chars):
+            if length and length + len(piece) > chunk_chars:
+                flush()
+            if parts and parts[-1]["type"] == "text":
+                parts[-1] = {"type": "text", "text": parts[-1]["text"] + piece}
+            else:
+                parts.append({"type": "text", "text": piece})
+            texts.append(piece)
+            length += len(piece)
+    flush()
+    return chunks
+
+
+async def _embed_texts(client, texts: List[str]):
+    """Embed texts in batches and return L2-normalized float32 rows"""
+    import numpy as np
+    
+    vectors = []
+    for start in range(0, len(texts), _EMBEDDING_BATCH_SIZE):
+        response = await client.embeddings.create(
+            model=_EMBEDDING_MODEL,
+            input=texts[start:start + _EMBEDDING_BATCH_SIZE],
+        )
+        vectors.extend(item.embedding for item in response.data)
+    embs = np.asarray(vectors, dtype=np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True) + 1e-12
+    return embs
+
+
+async def _select_chunks_per_query(
+    client,
+    content_parts: List[Dict],
+    queries: List[str],
+    top_k: int,
+) -> List[List[Dict]]:
+    """For each query, the content parts of its top_k most similar chunks, in document order"""
+    import numpy as np
+    
+    chunks = _chunk_content_parts(content_parts, _RETRIEVAL_CHUNK_CHARS)
+    if len(chunks) <= top_k:
+        return [content_parts] * len(queries)
+    
+    chunk_texts = [text for text, _ in chunks]
+    key = hashlib.blake2b("\0".join(chunk_texts).encode(), digest_size=16).hexdigest()
+    with _chunk_embeddings_lock:
+        embs = _chunk_embeddings.get(key)
+        if embs is not None:
+            _chunk_embeddings.move_to_end(key)
+    if embs is None:
+        embs = await _embed_texts(client, chunk_texts)
+        with _chunk_embeddings_lock:
+            _chunk_embeddings[key] = embs
+            while len(_chunk_embeddings) > _MAX_CACHED_EMBEDDINGS:
+                _chunk_embeddings.popitem(last=False)
+    
+    query_embs = await _embed_texts(client, queries)
+    scores = query_embs @ embs.T
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    
+    selections = []
+    for row in top:
+        parts = []
+        for i in sorted(row.tolist()):
+            parts.extend(chunks[i][1])
+        selections.append(parts)
+    return selections
+
+
+async def _build_content_parts(markdown_paths: List[str], embed_images: bool) -> Tuple[List, int]:
+    """Read every markdown file and embed its images, concatenated in file order"""
+    multiple = len(markdown_paths) > 1
+    # Reading and base64 encoding are blocking; cap how many files run at once
+    file_semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+    # Identical images within and across this document's files are encoded once;
+    # scoped to this call so the data URLs are freed with the run
+    image_parts: Dict = {}
+    
+    def process_md(md_path: str) -> Tuple[List, int]:
+        with open(md_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        # Replace images with base64 at original positions
+        return _replace_images_with_base64(content, str(Path(md_path).parent), embed_images, image_parts)
+    
+    async def process_md_async(md_path: str) -> Tuple[List, int]:
+        async with file_semaphore:
+            return await asyncio.to_thread(process_md, md_path)
+    
+    processed = await asyncio.gather(*(process_md_async(p) for p in markdown_paths))
+    
+    all_content_parts = []
+    total_images = 0
+    
+    # Assemble in the original file order
+    for md_path, (content_parts, img_count) in zip(markdown_paths, processed):
+        # Add document separator if multiple files
+        if multiple:
+            all_content_parts.append({
                 "type": "text",
-                "text": remaining_text
+                "text": f"\n\n=== {Path(md_path).name} ===\n\n"
             })
+        all_content_parts.extend(content_parts)
+        total_images += img_count
+        
+        logger.info(f"  {Path(md_path).name}: embedded {img_count} images")
     
-    return content_parts, image_count
+    return all_content_parts, total_images
+
+
+def _parts_cache_path(cache_dir: Path, markdown_paths: List[str], embed_images: bool) -> Path:
+    """Cache file for the embedded content of this exact set of markdown and image file versions"""
+    key_parts = []
+    for p in markdown_paths:
+        st = os.stat(p)
+        key_parts.append(f"{p}:{st.st_mtime_ns}:{st.st_size}")
+        if not embed_images:
+            continue
+        # Images are embedded by value, so a changed image must invalidate the cache too
+        with open(p, 'r', encoding='utf-8') as f:
+            content = f.read()
+        base_path = str(Path(p).parent)
+        for match in _IMAGE_RE.finditer(content):
+            image_path = _image_match_path(match, base_path)
+            try:
+                img_st = os.stat(image_path)
+                key_parts.append(f"{image_path}:{img_st.st_mtime_ns}:{img_st.st_size}")
+            except OSError:
+                key_parts.append(f"{image_path}:missing")
+    key_source = "\n".join(key_parts)
+    key_source += f"\nembed_images={embed_images}"
+    digest = hashlib.blake2b(key_source.encode(), digest_size=16).hexdigest()
+    return cache_dir / f"parts_{digest}.json.gz"
+
+
+def _load_parts_cache(path: Path) -> Optional[Dict]:
+    """Load cached embedded content, or None if there is no usable cache"""
+    try:
+        return orjson.loads(gzip.decompress(path.read_bytes()))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable content cache {path.name}: {e}")
+        return None
+
+
+def _save_parts_cache(path: Path, parts: List[Dict], images: int):
+    """Write embedded content atomically, replacing caches for older document versions"""
+    # Only the latest version of the document is worth keeping
+    for stale in path.parent.glob("parts_*.json.gz"):
+        stale.unlink(missing_ok=True)
+    # Level 1: base64 still shrinks by about a quarter and compressing stays cheap
+    tmp_path = path.with_suffix(".tmp")
+    try:
+        tmp_path.write_bytes(gzip.compress(orjson.dumps({"parts": parts, "images": images}), compresslevel=1))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write content cache {path.name}: {e}")
 
 
 async def _run_fast_queries_by_category(
@@ -124,96 +406,168 @@ async def _run_fast_queries_by_category(
     queries_by_category: Dict[str, List[str]],
     model: str = "gpt-4o",
     max_concurrency: int = 10,
+    embed_images: bool = True,
+    retrieve_topk: int = 0,
+    progress_path: Optional[Path] = None,
+    parts_cache_dir: Optional[Path] = None,
+    use_batch_api: bool = False,
 ) -> Dict[str, List[Dict]]:
     """
     Fast mode: Direct GPT-4o queries with markdown content and images in original positions
     
     Args:
-        client: OpenAI client
+        client: AsyncOpenAI client
         markdown_content: Complete markdown text
         markdown_paths: List of markdown file paths
         queries_by_category: Queries organized by category
         model: Model to use
         max_concurrency: Max concurrent queries
+        embed_images: Whether to inline images (disable for text-only endpoints)
+        retrieve_topk: If > 0, send each query only its top-k most similar document chunks
+        progress_path: JSONL sidecar that successful answers are appended to as they
+            complete; answers already in it for the same document are reused
+        parts_cache_dir: Directory for the compressed embedded-content cache reused
+            while the markdown files are unchanged
+        use_batch_api: Submit the queries as one OpenAI Batch API job (cheaper, but can
+            take minutes to hours); queries the job does not answer are sent live
     """
     # Process all markdown files and embed images at original positions
     logger.info("Processing markdown files and embedding images...")
     
-    all_content_parts = []
-    total_images = 0
-    
-    for md_path in markdown_paths:
-        base_path = str(Path(md_path).parent)
-        
-        # Add document separator if multiple files
-        if len(markdown_paths) > 1:
-            all_content_parts.append({
-                "type": "text",
-                "text": f"\n\n=== {Path(md_path).name} ===\n\n"
-            })
-        
-        with open(md_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Replace images with base64 at original positions
-        content_parts, img_count = _replace_images_with_base64(content, base_path)
-        all_content_parts.extend(content_parts)
-        total_images += img_count
-        
-        logger.info(f"  {Path(md_path).name}: embedded {img_count} images")
+    parts_cache_path = (
+        await asyncio.to_thread(_parts_cache_path, parts_cache_dir, markdown_paths, embed_images)
+        if parts_cache_dir else None
+    )
+    cached = await asyncio.to_thread(_load_parts_cache, parts_cache_path) if parts_cache_path else None
+    if cached is not None:
+        all_content_parts, total_images = cached["parts"], cached["images"]
+        logger.info(f"  Reusing embedded content from {parts_cache_path.name}")
+    else:
+        all_content_parts, total_images = await _build_content_parts(markdown_paths, embed_images)
+        if parts_cache_path:
+            await asyncio.to_thread(_save_parts_cache, parts_cache_path, all_content_parts, total_images)
     
     logger.info(f"Total embedded images: {total_images}")
     
-    semaphore = asyncio.Semaphore(max_concurrency)
+    # Every query shares the same document prefix; a stable per-document key lets
+    # the provider route them to the same prompt cache instead of re-prefilling it
+    key_source = "\n".join(f"{p}:{os.stat(p).st_mtime_ns}" for p in markdown_paths)
+    prompt_cache_key = f"p2s-{hashlib.blake2b(key_source.encode(), digest_size=16).hexdigest()}"
+    # Saved answers also depend on what was asked and how, not only on the document
+    progress_key = ResponseCache.make_key(prompt_cache_key, model, str(embed_images), str(retrieve_topk))
+    use_cache_key = True
     
-    async def query_one(category: str, idx: int, query: str):
-        async with semaphore:
-            try:
-                system_prompt = "You are an expert at analyzing academic papers. Answer based on the provided content."
-                
-                # Build message content
-                messages = [
-                    {"role": "system", "content": system_prompt}
-                ]
-                
-                # Build user message: document first, then query at the end
-                user_content = [
-                    {
-                        "type": "text",
-                        "text": "# Document Content\n\n"
-                    }
-                ]
-                
-                # Add all content parts (text and images in original order)
-                user_content.extend(all_content_parts)
-                
-                # Add query at the end
-                user_content.append({
-                    "type": "text",
-                    "text": f"""
+    # Build the shared part of every request once: document first, then query at the end
+    system_message = {
+        "role": "system",
+        "content": "You are an expert at analyzing academic papers. Answer based on the provided content."
+    }
+    document_header = {"type": "text", "text": "# Document Content\n\n"}
+    document_prefix = [document_header, *all_content_parts]
+    
+    # Flat (category, idx, query) list; retrieval results line up with it
+    flat_queries = [
+        (category, idx, query)
+        for category, queries in queries_by_category.items()
+        for idx, query in enumerate(queries)
+    ]
+    
+    query_prefixes = None
+    if retrieve_topk > 0:
+        try:
+            selections = await _select_chunks_per_query(
+                client, all_content_parts, [q for _, _, q in flat_queries], retrieve_topk
+            )
+            query_prefixes = {
+                (category, idx): [document_header, *parts]
+                for (category, idx, _), parts in zip(flat_queries, selections)
+            }
+            logger.info(f"Retrieved top-{retrieve_topk} chunks for {len(flat_queries)} queries")
+        except Exception as e:
+            logger.warning(f"Chunk retrieval failed, sending the full document: {e}")
+    
+    def question_part(query: str) -> Dict:
+        # Only the trailing question differs between queries
+        return {
+            "type": "text",
+            "text": f"""
 
 # Question
 
 {query}
 
 Please provide a detailed answer based on the content and images above."""
-                })
-                
-                messages.append({
-                    "role": "user",
-                    "content": user_content
-                })
+        }
+    
+    def build_messages(category: str, idx: int, query: str) -> List[Dict]:
+        return [
+            system_message,
+            {
+                "role": "user",
+                "content": (query_prefixes[(category, idx)] if query_prefixes else document_prefix) + [question_part(query)]
+            },
+        ]
+    
+    # The document dominates every request body: serialize it once and splice each
+    # question into the bytes, instead of letting the SDK re-encode it per query.
+    # Retrieved prefixes differ per query, so those are serialized once per query.
+    system_json = orjson.dumps(system_message)
+    document_prefix_json = orjson.dumps(document_prefix) if not query_prefixes else None
+    model_json = orjson.dumps(model)
+    
+    def build_body(prefix_json: bytes, query: str) -> bytes:
+        return b"".join((
+            b'{"model":', model_json,
+            b',"temperature":0.3,"messages":[', system_json,
+            b',{"role":"user","content":', prefix_json[:-1], b",", orjson.dumps(question_part(query)), b"]}]",
+            (b',"prompt_cache_key":' + orjson.dumps(prompt_cache_key)) if use_cache_key else b"",
+            b"}",
+        ))
+    
+    http_client = get_async_http_client()
+    chat_url = f"{str(client.base_url).rstrip('/')}/chat/completions"
+    # Same auth and custom headers/query params the SDK would send (Azure, OpenRouter, ...)
+    headers = {**client.default_headers, "Content-Type": "application/json"}
+    params = dict(client.default_query) or None
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def query_one(category: str, idx: int, query: str):
+        nonlocal use_cache_key
+        async with semaphore:
+            try:
+                prefix_json = orjson.dumps(query_prefixes[(category, idx)]) if query_prefixes else document_prefix_json
                 
-                # Call OpenAI API
-                response = await asyncio.to_thread(
-                    lambda: client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=0.3,
-                    )
-                )
+                # Call OpenAI API with the pre-serialized body, retrying like the SDK does:
+                # rate limits, server errors, timeouts and dropped connections
+                async def create() -> str:
+                    body = build_body(prefix_json, query)
+                    for attempt in range(_LIVE_QUERY_RETRIES + 1):
+                        delay = min(2 ** attempt, _LIVE_QUERY_MAX_DELAY)
+                        try:
+                            response = await http_client.post(chat_url, content=body, headers=headers, params=params)
+                        except httpx.TransportError:
+                            if attempt == _LIVE_QUERY_RETRIES:
+                                raise
+                            await asyncio.sleep(delay)
+                            continue
+                        if (response.status_code == 429 or response.status_code >= 500) and attempt < _LIVE_QUERY_RETRIES:
+                            retry_after = parse_duration(response.headers.get("retry-after"))
+                            await asyncio.sleep(min(retry_after, _LIVE_QUERY_MAX_DELAY) if retry_after else delay)
+                            continue
+                        if response.status_code >= 400:
+                            raise _QueryHTTPError(response.status_code, response.text)
+                        return orjson.loads(response.content)["choices"][0]["message"]["content"]
                 
-                answer = response.choices[0].message.content
+                try:
+                    answer = await create()
+                except _QueryHTTPError as e:
+                    # OpenAI-compatible endpoints may reject the unknown field; drop it for the rest of the run
+                    if not use_cache_key or e.status_code not in (400, 422) or "prompt_cache_key" not in e.body:
+                        raise
+                    logger.warning("Endpoint does not accept prompt_cache_key, retrying without it")
+                    use_cache_key = False
+                    answer = await create()
                 
                 return (category, idx, {
                     "query": query,
@@ -231,28 +585,141 @@ Please provide a detailed answer based on the content and images above."""
                     "error": str(e),
                 })
     
-    # Create all tasks
-    tasks = []
-    for category, queries in queries_by_category.items():
-        for idx, query in enumerate(queries):
-            tasks.append(query_one(category, idx, query))
+    # Answers saved by an interrupted run over the same document
+    done = _load_query_progress(progress_path, progress_key) if progress_path else {}
+    results_by_category = {cat: [None] * len(queries) for cat, queries in queries_by_category.items()}
+    
+    pending = []
+    for category, idx, query in flat_queries:
+        result = done.get((category, idx))
+        if result is not None and result.get("query") == query:
+            results_by_category[category][idx] = result
+        else:
+            pending.append((category, idx, query))
+    if len(pending) < len(flat_queries):
+        logger.info(f"Reusing {len(flat_queries) - len(pending)} answers from {progress_path.name}")
     
-    # Execute concurrently
-    all_results = await asyncio.gather(*tasks)
+    progress_file = open(progress_path, "ab") if progress_path and pending else None
     
-    # Group by category
-    results_by_category = {cat: [] for cat in queries_by_category.keys()}
-    for category, idx, result in all_results:
-        results_by_category[category].append((idx, result))
+    def record(category: str, idx: int, result: Dict):
+        results_by_category[category][idx] = result
+        if progress_file and result["success"]:
+            progress_file.write(orjson.dumps({
+                "key": progress_key,
+                "category": category,
+                "idx": idx,
+                "result": result,
+            }) + b"\n")
+            progress_file.flush()
     
-    # Restore order
-    for category in results_by_category:
-        results_by_category[category].sort(key=lambda x: x[0])
-        results_by_category[category] = [r for _, r in results_by_category[category]]
+    try:
+        # Offline runs: one Batch API job instead of live requests; anything it misses goes live
+        if use_batch_api and pending:
+            try:
+                answers = await _run_batch_queries(client, model, [
+                    (f"{category}:{idx}", build_messages(category, idx, query))
+                    for category, idx, query in pending
+                ])
+                remaining = []
+                for category, idx, query in pending:
+                    answer = answers.get(f"{category}:{idx}")
+                    if answer is None:
+                        remaining.append((category, idx, query))
+                        continue
+                    record(category, idx, {
+                        "query": query,
+                        "answer": answer,
+                        "mode": "fast_direct_with_vision",
+                        "success": True,
+                    })
+                pending = remaining
+            except Exception as e:
+                logger.warning(f"Batch API run failed, falling back to live queries: {e}")
+        
+        # Execute concurrently, recording each answer as soon as it arrives
+        tasks = [query_one(category, idx, query) for category, idx, query in pending]
+        for next_result in asyncio.as_completed(tasks):
+            record(*await next_result)
+    finally:
+        if progress_file:
+            progress_file.close()
     
     return results_by_category
 
 
+class _QueryHTTPError(RuntimeError):
+    """Error status from a raw chat completion request"""
+    
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"HTTP {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+
+
+async def _run_batch_queries(client, model: str, requests: List[Tuple[str, List[Dict]]]) -> Dict[str, str]:
+    """Run chat completions as one OpenAI Batch API job and return {custom_id: answer} for the ones that succeeded"""
+    lines = [
+        orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": model, "messages": messages, "temperature": 0.3},
+        })
+        for custom_id, messages in requests
+    ]
+    input_file = await client.files.create(file=("queries.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info(f"Submitted batch {batch.id} with {len(requests)} queries")
+    
+    while batch.status in _BATCH_ACTIVE_STATES:
+        await asyncio.sleep(_BATCH_POLL_INTERVAL)
+        batch = await client.batches.retrieve(batch.id)
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
+    
+    output = await client.files.content(batch.output_file_id)
+    answers = {}
+    for line in output.content.splitlines():
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        response = entry.get("response") or {}
+        if response.get("status_code") == 200:
+            answers[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        else:
+            logger.error(f"Batch query {entry.get('custom_id')} failed: {entry.get('error') or response.get('body')}")
+    return answers
+
+
+def _load_query_progress(progress_path: Path, run_key: str) -> Dict[Tuple[str, int], Dict]:
+    """Read successful answers for run_key (document, model and query settings) from a fast-mode progress sidecar"""
+    done = {}
+    try:
+        with open(progress_path, "rb") as f:
+            for line in f:
+                try:
+                    entry = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # torn last line from a crash
+                if entry.get("key") == run_key:
+                    done[(entry["category"], entry["idx"])] = entry["result"]
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _find_markdown_paths(output_dir: Path) -> List[str]:
+    """Markdown files produced under output_dir, in a stable order across runs"""
+    paths = []
+    for root, _dirs, files in os.walk(output_dir):
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(".md"))
+    return sorted(paths)
+
+
 async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
     """Stage 1: Index document and run RAG queries.
     
@@ -307,8 +774,7 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
         logger.info(f"  Parsing completed: {len(parse_result.successful_files)} successful")
         
         # Collect markdown files
-        md_files = list(output_dir.rglob("*.md"))
-        markdown_paths = [str(f) for f in md_files]
+        markdown_paths = _find_markdown_paths(output_dir)
         
         if not markdown_paths:
             raise ValueError("No markdown files generated")
@@ -319,22 +785,30 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
         logger.info("")
         logger.info(f"Running queries with GPT-4o and images ({content_type})...")
         
-        from openai import OpenAI
+        if content_type != "paper":
+            raise ValueError("Fast mode currently only supports content_type='paper'")
         
         api_key = os.getenv("RAG_LLM_API_KEY", "")
         base_url = os.getenv("RAG_LLM_BASE_URL")
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        checkpoint_path = get_rag_checkpoint(base_dir, config)
+        checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        progress_path = checkpoint_path.with_suffix(".jsonl")
+        
+        # Pooled client shared by every async LLM call on this event loop
+        client = get_async_llm_client(api_key, base_url)
         
         # Execute queries (direct GPT-4o with images in original positions)
-        if content_type == "paper":
-            rag_results = await _run_fast_queries_by_category(
-                client=client,
-                markdown_content="",  # Not used anymore, content is processed inside
-                markdown_paths=markdown_paths,
-                queries_by_category=RAG_PAPER_QUERIES,
-            )
-        else:
-            raise ValueError("Fast mode currently only supports content_type='paper'")
+        rag_results = await _run_fast_queries_by_category(
+            client=client,
+            markdown_content="",  # Not used anymore, content is processed inside
+            markdown_paths=markdown_paths,
+            queries_by_category=RAG_PAPER_QUERIES,
+            embed_images=config.get("embed_images", True),
+            retrieve_topk=config.get("retrieve_topk", 0),
+            progress_path=progress_path,
+            parts_cache_dir=output_dir,
+            use_batch_api=config.get("use_batch_api", False),
+        )
         
         total = sum(len(r) for r in rag_results.values())
         logger.info(f"  Completed {total} queries")
@@ -342,7 +816,10 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
     # ========== NORMAL MODE: Full RAG pipeline ==========
     else:
         from paper2slides.rag import RAGClient, RAG_PAPER_QUERIES, RAG_QUERY_MODES
-        from paper2slides.rag.query import get_general_overview, generate_general_queries
+        from paper2slides.rag.query import (
+            get_general_overview, generate_general_queries, batch_query_section, semantic_batch_query,
+            OVERVIEW_MAX_SECTION_LENGTH,
+        )
         from paper2slides.rag.config import RAGConfig
         
         storage_dir = base_dir / "rag_storage"
@@ -371,8 +848,7 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
             logger.info(f"  Indexing completed: {batch_result.get('successful_rag_files', 0)} successful, {batch_result.get('failed_rag_files', 0)} failed")
             
             # Collect markdown paths from parser output
-            md_files = list(output_dir.rglob("*.md"))
-            markdown_paths = [str(f) for f in md_files]
+            markdown_paths = _find_markdown_paths(output_dir)
             
             if markdown_paths:
                 logger.info(f"  Found {len(markdown_paths)} markdown file(s)")
@@ -380,18 +856,29 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
             logger.info("")
             logger.info(f"Running RAG queries ({content_type})...")
             
-            if content_type == "paper":
+            if content_type == "paper" and config.get("batch_section_queries", False):
+                # One combined query per section instead of one per question
+                categories = list(RAG_PAPER_QUERIES)
+                section_results = await asyncio.gather(
+                    *(batch_query_section(rag, category) for category in categories)
+                )
+                rag_results = dict(zip(categories, section_results))
+            elif content_type == "paper":
                 rag_results = await rag.batch_query_by_category(
                     queries_by_category=RAG_PAPER_QUERIES,
                     modes_by_category=RAG_QUERY_MODES,
                 )
             else:
                 logger.info("  Getting document overview...")
-                overview = await get_general_overview(rag, mode="mix")
+                overview = await get_general_overview(
+                    rag,
+                    mode="mix",
+                    max_section_length=config.get("overview_max_section_length", OVERVIEW_MAX_SECTION_LENGTH),
+                )
                 logger.info("  Generating queries from overview...")
-                queries = generate_general_queries(rag, overview, count=12)
+                queries = await generate_general_queries(rag, overview, count=12)
                 logger.info(f"  Executing {len(queries)} queries...")
-                query_results = await rag.batch_query(queries, mode="mix")
+                query_results = await semantic_batch_query(rag, queries, mode="mix")
                 rag_results = {"content": query_results}
             
             total = sum(len(r) for r in rag_results.values())
@@ -412,4 +899,8 @@ async def run_rag_stage(base_dir: Path, config: Dict) -> Dict:
     
     save_json(checkpoint_path, result)
     logger.info(f"  Saved: {checkpoint_path}")
+    
+    # The checkpoint now holds every answer, so the partial-progress sidecar is obsolete
+    if fast_mode:
+        progress_path.unlink(missing_ok=True)
     return result
@@ -2,22 +2,36 @@
 Summary Stage - Content extraction from RAG results
 """
 import os
+import copy
 import logging
+import functools
 from pathlib import Path
 from typing import Dict
 
 from ...utils import load_json, save_json, save_text
+from ...utils.llm_client import get_llm_client
+from ...summary import extract_paper, extract_general, extract_tables_and_figures, OriginalElements
+from ...summary.paper import extract_paper_metadata_from_markdown
 from ..paths import get_rag_checkpoint, get_summary_checkpoint, get_summary_md
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=64)
+def _cached_tables_and_figures(md_path: str, mtime_ns: int, size: int) -> OriginalElements:
+    """Parse one version of a markdown file (mtime/size only key the cache)"""
+    return extract_tables_and_figures(md_path)
+
+
+def _load_tables_and_figures(md_path: str) -> OriginalElements:
+    """Extract tables and figures, reusing the parse while the file is unchanged"""
+    st = os.stat(md_path)
+    # Callers rewrite IDs in place, so hand out a copy of the cached result
+    return copy.deepcopy(_cached_tables_and_figures(md_path, st.st_mtime_ns, st.st_size))
+
+
 async def run_summary_stage(base_dir: Path, config: Dict) -> Dict:
     """Stage 2: Extract content from RAG results."""
-    from openai import OpenAI
-    from paper2slides.summary import extract_paper, extract_general, extract_tables_and_figures, OriginalElements
-    from paper2slides.summary.paper import extract_paper_metadata_from_markdown
-    
     rag_data = load_json(get_rag_checkpoint(base_dir, config))
     if not rag_data:
         raise ValueError("Missing RAG checkpoint.")
@@ -28,7 +42,7 @@ async def run_summary_stage(base_dir: Path, config: Dict) -> Dict:
     
     api_key = os.getenv("RAG_LLM_API_KEY", "")
     base_url = os.getenv("RAG_LLM_BASE_URL")
-    llm_client = OpenAI(api_key=api_key, base_url=base_url)
+    llm_client = get_llm_client(api_key, base_url)
     
     logger.info(f"Extracting content from indexed documents ({content_type})...")
     
@@ -83,19 +97,22 @@ async def run_summary_stage(base_dir: Path, config: Dict) -> Dict:
     base_path = ""
     
     for i, md_path in enumerate(markdown_paths):
-        origin = extract_tables_and_figures(md_path)
+        origin = _load_tables_and_figures(md_path)
         
         # Add document prefix to IDs if multiple documents (to avoid conflicts)
         if len(markdown_paths) > 1:
             doc_prefix = f"Doc{i+1}"
+            pfx = doc_prefix + "_"
             # Prefix table IDs
             for table in origin.tables:
-                if not table.table_id.startswith(doc_prefix):
-                    table.table_id = f"{doc_prefix}_{table.table_id}"
+                tid = table.table_id
+                if not tid.startswith(doc_prefix):
+                    table.table_id = pfx + tid
             # Prefix figure IDs
             for figure in origin.figures:
-                if not figure.figure_id.startswith(doc_prefix):
-                    figure.figure_id = f"{doc_prefix}_{figure.figure_id}"
+                fid = figure.figure_id
+                if not fid.startswith(doc_prefix):
+                    figure.figure_id = pfx + fid
         
         all_tables.extend(origin.tables)
         all_figures.extend(origin.figures)
@@ -115,7 +132,7 @@ async def run_summary_stage(base_dir: Path, config: Dict) -> Dict:
     
     result = {
         "content_type": content_type,
-        "content": content.__dict__,
+        "content": content.to_dict(),
         "origin": {
             "tables": origin.get_table_info(),
             "figures": origin.get_figure_info(),
@@ -28,6 +28,7 @@ def load_state(config_dir: Path) -> Optional[Dict]:
 def save_state(config_dir: Path, state: Dict):
     """Save pipeline state to file."""
     state["updated_at"] = datetime.now().isoformat()
+    # save_json replaces the file atomically, so status polls never read a partial write
     save_json(get_state_path(config_dir), state)
 
 
@@ -35,6 +35,13 @@ class StyleType(str, Enum):
     CUSTOM = "custom"
 
 
+# Value -> member lookups for building configs from pipeline config dicts
+_OUTPUT_TYPES: Dict[str, OutputType] = {m.value: m for m in OutputType}
+_POSTER_DENSITIES: Dict[str, PosterDensity] = {m.value: m for m in PosterDensity}
+_SLIDES_LENGTHS: Dict[str, SlidesLength] = {m.value: m for m in SlidesLength}
+_STYLE_TYPES: Dict[str, StyleType] = {m.value: m for m in StyleType}
+
+
 # Page count ranges for each slides length
 SLIDES_PAGE_RANGES: Dict[str, tuple[int, int]] = {
     "short": (5, 8),
@@ -67,6 +74,17 @@ class GenerationConfig:
     style: StyleType = StyleType.ACADEMIC
     custom_style: Optional[str] = None
     
+    @classmethod
+    def from_dict(cls, config: Dict[str, Any]) -> "GenerationConfig":
+        """Build from a pipeline config dict, falling back to defaults for unknown values."""
+        return cls(
+            output_type=_OUTPUT_TYPES.get(config.get("output_type"), OutputType.SLIDES),
+            poster_density=_POSTER_DENSITIES.get(config.get("poster_density"), PosterDensity.MEDIUM),
+            slides_length=_SLIDES_LENGTHS.get(config.get("slides_length"), SlidesLength.MEDIUM),
+            style=_STYLE_TYPES.get(config.get("style"), StyleType.ACADEMIC),
+            custom_style=config.get("custom_style"),
+        )
+    
     def get_page_range(self) -> tuple[int, int]:
         """Get page count range for slides."""
         return SLIDES_PAGE_RANGES.get(self.slides_length.value, (8, 12))
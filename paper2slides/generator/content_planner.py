@@ -21,7 +21,7 @@ from ..prompts.content_planning import (
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class TableRef:
     """Table reference for a section."""
     table_id: str           # e.g., "Table 1"
@@ -29,14 +29,14 @@ class TableRef:
     focus: str = ""         # Optional: what aspect to emphasize
 
 
-@dataclass
+@dataclass(slots=True)
 class FigureRef:
     """Figure reference for a section."""
     figure_id: str          # e.g., "Figure 1"
     focus: str = ""         # Optional: what to emphasize, description of the figure
 
 
-@dataclass
+@dataclass(slots=True)
 class Section:
     """A single section/slide in the output."""
     id: str
@@ -75,7 +75,7 @@ class Section:
         return result
 
 
-@dataclass
+@dataclass(slots=True)
 class ContentPlan:
     """Planned content structure for generation."""
     output_type: str
@@ -129,15 +129,8 @@ class ContentPlanner:
     
     def plan(self, gen_input: GenerationInput) -> ContentPlan:
         """Create a content plan from generation input."""
-        # Build tables index
-        tables_index = {}
-        for tbl in gen_input.origin.tables:
-            tables_index[tbl.table_id] = tbl
-        
-        # Build figures index
-        figures_index = {}
-        for fig in gen_input.origin.figures:
-            figures_index[fig.figure_id] = fig
+        tables_index = gen_input.origin.get_tables_index()
+        figures_index = gen_input.origin.get_figures_index()
         
         # Get summary and format tables/figures
         summary = gen_input.get_summary_text()
@@ -456,7 +449,13 @@ class ContentPlanner:
         return images
     
     def _truncate(self, text: str, max_len: int) -> str:
-        """Truncate text to max length."""
+        """Truncate text to max length, preferring a paragraph or line boundary."""
         if len(text) <= max_len:
             return text
-        return text[:max_len] + "\n\n[Content truncated...]"
+        cut = text.rfind("\n\n", 0, max_len)
+        if cut < max_len // 2:
+            cut = text.rfind("\n", 0, max_len)
+        if cut < max_len // 2:
+            # No break in the second half (one long paragraph): hard cut
+            cut = max_len
+        return text[:cut] + "\n\n[Content truncated...]"
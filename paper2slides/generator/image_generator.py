@@ -4,18 +4,35 @@ Image Generator
 Generate poster/slides images from ContentPlan.
 """
 import os
-import json
+import mmap
 import base64
-import time
+import binascii
+import hashlib
+import random
+import asyncio
 import logging
-from dataclasses import dataclass
+import functools
+import threading
+from dataclasses import dataclass, asdict
 from pathlib import Path
 from typing import List, Optional
-from openai import OpenAI
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import httpx
+import openai
+import orjson
+from openai import OpenAI, AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import h2  # noqa: F401  # enables HTTP/2 in httpx
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
 
 from .config import GenerationInput
 from .content_planner import ContentPlan, Section
+from .rate_limit import CircuitBreaker, RateLimiter
+from ..utils.response_cache import ResponseCache, get_response_cache
 from ..prompts.image_generation import (
     STYLE_PROCESS_PROMPT,
     FORMAT_POSTER,
@@ -33,6 +50,145 @@ from ..prompts.image_generation import (
     POSTER_FIGURE_HINT,
 )
 
+logger = logging.getLogger(__name__)
+
+# Image API retry policy: transient failures back off exponentially with jitter, capped at MAX_RETRY_DELAY
+MAX_RETRIES = 3
+MAX_RETRY_DELAY = 60
+# Image generation is slow to respond, but a hung connection must not hold a worker forever
+REQUEST_TIMEOUT = httpx.Timeout(connect=10.0, read=180.0, write=30.0, pool=10.0)
+# One pool per client, sized well above the slide fan-out so workers never wait for a connection
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+# Batch API polling backs off from the first to the max interval (seconds)
+BATCH_POLL_INITIAL = 10
+BATCH_POLL_MAX = 300
+_BATCH_ACTIVE_STATES = frozenset({"validating", "in_progress", "finalizing"})
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether a failed image request may succeed on retry."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return 500 <= error.status_code < 600
+    # Raised by _extract_image when the model answered without an image
+    return isinstance(error, RuntimeError)
+
+
+def _is_outage(error: Exception) -> bool:
+    """Whether a failure means the provider is down rather than busy or unhappy with one request."""
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, openai.APIStatusError) and 500 <= error.status_code < 600
+
+
+def _retry_delay(attempt: int) -> float:
+    """Seconds to wait after failed attempt n (0-based)."""
+    return min(MAX_RETRY_DELAY, 2 ** attempt) + random.uniform(0, 1)
+
+
+# Vision models downsample large inputs anyway, so bigger figures are shrunk before upload
+MAX_FIGURE_DIMENSION = 1600
+FIGURE_JPEG_QUALITY = 82
+
+# Figures up to this size are encoded straight from a memory map; larger ones in chunks
+_MMAP_MAX_SIZE = 16 * 1024 * 1024
+_B64_CHUNK_SIZE = 3 * 64 * 1024  # multiple of 3, so chunk encodings concatenate cleanly
+
+
+def _encode_file_base64(path: Path) -> str:
+    """Base64-encode a file without first reading it into a bytes copy."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ""  # empty files cannot be mapped
+        if size <= _MMAP_MAX_SIZE:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return base64.b64encode(mm).decode("ascii")
+        encoded = bytearray()
+        for chunk in iter(lambda: f.read(_B64_CHUNK_SIZE), b""):
+            encoded += base64.b64encode(chunk)
+        return encoded.decode("ascii")
+
+
+def _downscale_figure(path: Path) -> Optional[tuple]:
+    """Shrink a figure larger than MAX_FIGURE_DIMENSION to (image_data, mime_type), or None if it is small enough."""
+    from PIL import Image
+    import io
+    
+    with Image.open(path) as im:
+        if max(im.size) <= MAX_FIGURE_DIMENSION:
+            return None
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGBA" if im.mode in ("LA", "PA") or "transparency" in im.info else "RGB")
+        im.thumbnail((MAX_FIGURE_DIMENSION, MAX_FIGURE_DIMENSION), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        # Keep PNG only where transparency is actually used; everything else becomes a much smaller JPEG
+        if im.mode == "RGBA" and im.getchannel("A").getextrema()[0] < 255:
+            im.save(buf, "PNG", optimize=True)
+            return buf.getvalue(), "image/png"
+        im.convert("RGB").save(buf, "JPEG", quality=FIGURE_JPEG_QUALITY, optimize=True)
+        return buf.getvalue(), "image/jpeg"
+
+
+@dataclass(frozen=True)
+class _Settings:
+    """Environment configuration for image generation, read once per process."""
+    llm_model: str
+    image_api_key: str
+    image_base_url: str
+    image_rpm: int
+    image_tpm: int
+    cache_images: bool
+    stream_images: bool
+
+
+@functools.lru_cache(maxsize=1)
+def _settings() -> _Settings:
+    # Read on first use rather than at import, so a .env loaded by the caller is seen
+    return _Settings(
+        llm_model=os.getenv("LLM_MODEL", "openai/gpt-4o-mini"),
+        image_api_key=os.getenv("IMAGE_GEN_API_KEY", ""),
+        image_base_url=os.getenv("IMAGE_GEN_BASE_URL", "https://openrouter.ai/api/v1"),
+        image_rpm=int(os.getenv("IMAGE_GEN_RPM", "0")),
+        image_tpm=int(os.getenv("IMAGE_GEN_TPM", "0")),
+        cache_images=os.getenv("P2S_CACHE_IMAGES") == "1",
+        stream_images=os.getenv("IMAGE_GEN_STREAM") == "1",
+    )
+
+
+class _DataUrlDecoder:
+    """Decode a base64 image data URL that arrives in pieces, as the pieces arrive."""
+    
+    def __init__(self):
+        self.mime_type = None
+        self._header = ""
+        self._pending = ""
+        self._data = bytearray()
+    
+    def feed(self, piece: str):
+        if self.mime_type is None:
+            self._header += piece
+            if "," not in self._header:
+                return
+            header, piece = self._header.split(",", 1)
+            self.mime_type = header.split(":")[1].split(";")[0]
+        # Decode whole 4-character groups now and carry the remainder to the next piece
+        self._pending += piece
+        usable = len(self._pending) - len(self._pending) % 4
+        if usable:
+            self._data += binascii.a2b_base64(self._pending[:usable])
+            self._pending = self._pending[usable:]
+    
+    def result(self) -> tuple:
+        """Return (image_data, mime_type), or raise RuntimeError if no image arrived."""
+        if self.mime_type is None or not (self._data or self._pending):
+            raise RuntimeError("Image generation failed - no images in response")
+        if self._pending:
+            self._data += binascii.a2b_base64(self._pending)
+            self._pending = ""
+        return bytes(self._data), self.mime_type
+
 
 @dataclass
 class GeneratedImage:
@@ -40,6 +196,11 @@ class GeneratedImage:
     section_id: str
     image_data: bytes
     mime_type: str
+    
+    @functools.cached_property
+    def b64(self) -> str:
+        """Base64 of image_data, encoded on first use."""
+        return base64.b64encode(self.image_data).decode("ascii")
 
 
 @dataclass
@@ -55,7 +216,14 @@ class ProcessedStyle:
 
 def process_custom_style(client: OpenAI, user_style: str, model: str = None) -> ProcessedStyle:
     """Process user's custom style request with LLM."""
-    model = model or os.getenv("LLM_MODEL", "openai/gpt-4o-mini")
+    model = model or _settings().llm_model
+    
+    # The result depends only on the request, so valid styles are reused across runs
+    cache = get_response_cache()
+    cache_key = ResponseCache.make_key(model, STYLE_PROCESS_PROMPT, user_style)
+    cached = cache.get_json("styles", cache_key)
+    if cached is not None:
+        return ProcessedStyle(**cached)
     
     try:
         response = client.chat.completions.create(
@@ -63,8 +231,8 @@ def process_custom_style(client: OpenAI, user_style: str, model: str = None) ->
             messages=[{"role": "user", "content": STYLE_PROCESS_PROMPT.format(user_style=user_style)}],
             response_format={"type": "json_object"},
         )
-        result = json.loads(response.choices[0].message.content)
-        return ProcessedStyle(
+        result = orjson.loads(response.choices[0].message.content)
+        processed = ProcessedStyle(
             style_name=result.get("style_name", ""),
             color_tone=result.get("color_tone", ""),
             special_elements=result.get("special_elements", ""),
@@ -72,6 +240,9 @@ def process_custom_style(client: OpenAI, user_style: str, model: str = None) ->
             valid=result.get("valid", False),
             error=result.get("error"),
         )
+        if processed.valid:
+            cache.set_json("styles", cache_key, asdict(processed))
+        return processed
     except Exception as e:
         return ProcessedStyle(style_name="", color_tone="", special_elements="", decorations="", valid=False, error=str(e))
 
@@ -84,11 +255,66 @@ class ImageGenerator:
         api_key: str = None,
         base_url: str = None,
         model: str = "google/gemini-3-pro-image-preview",
+        rpm: int = None,
+        tpm: int = None,
+        cache_images: bool = None,
+        stream_images: bool = None,
     ):
-        self.api_key = api_key or os.getenv("IMAGE_GEN_API_KEY", "")
-        self.base_url = base_url or os.getenv("IMAGE_GEN_BASE_URL", "https://openrouter.ai/api/v1")
+        settings = _settings()
+        self.api_key = api_key or settings.image_api_key
+        self.base_url = base_url or settings.image_base_url
         self.model = model
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Shared by every worker so parallel slides are paced instead of retried on 429 (0 = no limit)
+        self._limiter = RateLimiter(
+            rpm=rpm if rpm is not None else settings.image_rpm,
+            tpm=tpm if tpm is not None else settings.image_tpm,
+        )
+        # Shared by all workers, so an outage stops every slide instead of each retrying on its own
+        self._breaker = CircuitBreaker(fail_max=5, reset_timeout=30)
+        # Retries are handled in _call_model_async, so the SDK's own are disabled
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            max_retries=0,
+            http_client=httpx.Client(http2=_HTTP2, limits=HTTP_LIMITS, timeout=REQUEST_TIMEOUT),
+        )
+        # OpenRouter honours explicit cache breakpoints; OpenAI caches identical prefixes on its own
+        self._mark_cacheable_prefix = "openrouter.ai" in self.base_url
+        self._async_client = None
+        self._async_client_loop = None
+        # Opt-in: replaying an identical request returns the earlier image instead of a new one
+        self.cache_images = cache_images if cache_images is not None else settings.cache_images
+        self._response_cache = get_response_cache()
+        # Opt-in: not every provider streams image output
+        self.stream_images = stream_images if stream_images is not None else settings.stream_images
+    
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client for the running event loop.
+        
+        Its connection pool is bound to the loop it was first used on, and each
+        pipeline run gets a fresh loop, so a new client is created per loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=0,
+                http_client=httpx.AsyncClient(http2=_HTTP2, limits=HTTP_LIMITS, timeout=REQUEST_TIMEOUT),
+            )
+            self._async_client_loop = loop
+        return self._async_client
+    
+    def close(self):
+        """Close the pooled sync HTTP client."""
+        self.client.close()
+    
+    async def aclose_async_client(self):
+        """Close the async client of the running event loop, if one was opened on it."""
+        if self._async_client_loop is asyncio.get_running_loop():
+            client, self._async_client, self._async_client_loop = self._async_client, None, None
+            await client.close()
     
     def generate(
         self,
@@ -96,6 +322,7 @@ class ImageGenerator:
         gen_input: GenerationInput,
         max_workers: int = 1,
         save_callback = None,
+        use_batch_api: bool = False,
     ) -> List[GeneratedImage]:
         """
         Generate images from ContentPlan.
@@ -105,141 +332,212 @@ class ImageGenerator:
             gen_input: GenerationInput with config and origin
             max_workers: Maximum parallel workers for slides (3rd+ slides run in parallel)
             save_callback: Optional callback function(generated_image, index, total) called after each image
+            use_batch_api: Submit slides 3+ as one Batch API job (see generate_async)
+        
+        Returns:
+            List of GeneratedImage (1 for poster, N for slides)
+        
+        Slide requests are network-bound, so this drives generate_async() on a
+        fresh event loop rather than a thread pool; from async code, await
+        generate_async() directly.
+        """
+        async def run():
+            try:
+                return await self.generate_async(
+                    plan, gen_input, max_workers=max_workers, save_callback=save_callback, use_batch_api=use_batch_api,
+                )
+            finally:
+                await self.aclose_async_client()
+        
+        return asyncio.run(run())
+    
+    async def generate_async(
+        self,
+        plan: ContentPlan,
+        gen_input: GenerationInput,
+        max_workers: int = 8,
+        save_callback = None,
+        use_batch_api: bool = False,
+    ) -> List[GeneratedImage]:
+        """
+        Generate images from ContentPlan without blocking the event loop.
+        
+        Slides 1-2 are sequential (slide 2 becomes the style reference),
+        slides 3+ are requested concurrently. With image caching enabled the
+        reference is saved, so a repeat run of the same deck and style reuses
+        slide 2 as is and requests every other slide concurrently.
+        
+        Args:
+            plan: ContentPlan from ContentPlanner
+            gen_input: GenerationInput with config and origin
+            max_workers: Maximum in-flight image requests for slides 3+
+            save_callback: Optional sync callback(generated_image, index, total), run in a worker thread
+            use_batch_api: Submit slides 3+ as one OpenAI Batch API job (cheaper, but can
+                take much longer). Slides the batch does not return, or all of them if the
+                provider has no Batch API, are then requested live.
         
         Returns:
             List of GeneratedImage (1 for poster, N for slides)
         """
-        figure_images = self._load_figure_images(plan, gen_input.origin.base_path)
+        figure_images = await asyncio.to_thread(self._load_figure_images, plan, gen_input.origin.base_path)
+        style_name, processed_style = await asyncio.to_thread(self._process_style, gen_input)
+        
+        section_mds = self._format_section_markdowns(plan)
+        all_sections_md = self._format_sections_markdown(section_mds)
+        
+        if plan.output_type == "poster":
+            prompt = self._build_poster_prompt(
+                format_prefix=FORMAT_POSTER,
+                style_name=style_name,
+                processed_style=processed_style,
+                sections_md=all_sections_md,
+            )
+            image_data, mime_type = await self._call_model_async(prompt, self._filter_images(plan.sections, figure_images))
+            result = [GeneratedImage(section_id="poster", image_data=image_data, mime_type=mime_type)]
+            if save_callback:
+                await asyncio.to_thread(save_callback, result[0], 0, 1)
+            return result
+        
+        total = len(plan.sections)
+        slide_prefix = self._build_slide_prefix(style_name, processed_style, all_sections_md)
+        slide_prompts = self._build_slide_prompts(plan, self._select_layouts(style_name), section_mds)
+        results = [None] * total
+        # A reference saved by an earlier run of the same deck lets every slide start at once
+        style_ref_key = ResponseCache.make_key(self.model, slide_prefix)
+        style_ref_image = None
+        saved_ref = None
+        if self.cache_images and total > 1:
+            saved_ref = await asyncio.to_thread(self._load_style_reference, style_ref_key)
+        if saved_ref:
+            # The saved reference is that run's slide 2: reuse it instead of regenerating slide 2 against itself
+            style_ref_image = self._make_style_reference(saved_ref)
+            results[1] = GeneratedImage(
+                section_id=plan.sections[1].id, image_data=saved_ref.image_data, mime_type=saved_ref.mime_type
+            )
+            if save_callback:
+                await asyncio.to_thread(save_callback, results[1], 1, total)
+        sequential = 0 if saved_ref else min(2, total)
+        
+        async def generate_single(i):
+            prompt, reference_images = self._build_slide_request(
+                i, plan, slide_prompts, figure_images, style_ref_image
+            )
+            image_data, mime_type = await self._call_model_async(prompt, reference_images, prefix=slide_prefix)
+            return i, GeneratedImage(section_id=plan.sections[i].id, image_data=image_data, mime_type=mime_type)
+        
+        # Slides 1-2 sequentially (slide 1: no ref, slide 2: becomes ref)
+        for i in range(sequential):
+            _, generated_img = await generate_single(i)
+            if i == 1:
+                style_ref_image = self._make_style_reference(generated_img)
+                if self.cache_images:
+                    await asyncio.to_thread(self._store_style_reference, style_ref_key, generated_img)
+            results[i] = generated_img
+            if save_callback:
+                await asyncio.to_thread(save_callback, generated_img, i, total)
+        
+        pending = [i for i in range(sequential, total) if results[i] is None]
+        if use_batch_api and pending:
+            try:
+                batch_images = await self._run_batch_slides([
+                    (f"slide-{i}", self._build_message_content(
+                        *self._build_slide_request(i, plan, slide_prompts, figure_images, style_ref_image),
+                        prefix=slide_prefix,
+                    ))
+                    for i in pending
+                ])
+            except Exception as e:
+                logger.warning(f"Batch API run failed, falling back to live requests: {e}")
+                batch_images = {}
+            for i in pending:
+                if f"slide-{i}" not in batch_images:
+                    continue
+                image_data, mime_type = batch_images[f"slide-{i}"]
+                results[i] = GeneratedImage(section_id=plan.sections[i].id, image_data=image_data, mime_type=mime_type)
+                if save_callback:
+                    await asyncio.to_thread(save_callback, results[i], i, total)
+            pending = [i for i in pending if results[i] is None]
+        
+        # Remaining slides concurrently, at most max_workers requests in flight
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+        
+        async def generate_limited(i):
+            async with semaphore:
+                return await generate_single(i)
+        
+        tasks = [asyncio.create_task(generate_limited(i)) for i in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                idx, generated_img = await next_done
+                results[idx] = generated_img
+                if save_callback:
+                    await asyncio.to_thread(save_callback, generated_img, idx, total)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        
+        return results
+    
+    def _process_style(self, gen_input: GenerationInput) -> tuple:
+        """Return (style_name, processed_style), processing custom styles with LLM."""
         style_name = gen_input.config.style.value
         custom_style = gen_input.config.custom_style
         
-        # Process custom style with LLM if needed
         processed_style = None
         if style_name == "custom" and custom_style:
             processed_style = process_custom_style(self.client, custom_style)
             if not processed_style.valid:
                 raise ValueError(f"Invalid custom style: {processed_style.error}")
-        
-        all_sections_md = self._format_sections_markdown(plan)
-        all_images = self._filter_images(plan.sections, figure_images)
-        
-        if plan.output_type == "poster":
-            result = self._generate_poster(style_name, processed_style, all_sections_md, all_images)
-            if save_callback and result:
-                save_callback(result[0], 0, 1)
-            return result
-        else:
-            return self._generate_slides(plan, style_name, processed_style, all_sections_md, figure_images, max_workers, save_callback)
-    
-    def _generate_poster(self, style_name, processed_style: Optional[ProcessedStyle], sections_md, images) -> List[GeneratedImage]:
-        """Generate 1 poster image."""
-        prompt = self._build_poster_prompt(
-            format_prefix=FORMAT_POSTER,
-            style_name=style_name,
-            processed_style=processed_style,
-            sections_md=sections_md,
-        )
-        
-        image_data, mime_type = self._call_model(prompt, images)
-        return [GeneratedImage(section_id="poster", image_data=image_data, mime_type=mime_type)]
+        return style_name, processed_style
     
-    def _generate_slides(self, plan, style_name, processed_style: Optional[ProcessedStyle], all_sections_md, figure_images, max_workers: int, save_callback=None) -> List[GeneratedImage]:
-        """Generate N slide images (slides 1-2 sequential, 3+ parallel)."""
-        results = []
-        total = len(plan.sections)
-        
-        # Select layout rules based on style
+    def _select_layouts(self, style_name: str) -> dict:
+        """Select slide layout rules based on style."""
         if style_name == "custom":
-            layouts = SLIDE_LAYOUTS_DEFAULT
+            return SLIDE_LAYOUTS_DEFAULT
         elif style_name == "doraemon":
-            layouts = SLIDE_LAYOUTS_DORAEMON
-        else:
-            layouts = SLIDE_LAYOUTS_ACADEMIC
-        
-        style_ref_image = None  # Store 2nd slide as reference for all subsequent slides
-        
-        # Generate first 2 slides sequentially (slide 1: no ref, slide 2: becomes ref)
-        for i in range(min(2, total)):
-            section = plan.sections[i]
-            section_md = self._format_single_section_markdown(section, plan)
-            layout_rule = layouts.get(section.section_type, layouts["content"])
-            
-            prompt = self._build_slide_prompt(
-                style_name=style_name,
-                processed_style=processed_style,
+            return SLIDE_LAYOUTS_DORAEMON
+        return SLIDE_LAYOUTS_ACADEMIC
+    
+    def _build_slide_prompts(self, plan, layouts, section_mds: List[str]) -> List[str]:
+        """Build every slide's prompt (the part after the shared slide prefix) up front."""
+        total = len(plan.sections)
+        return [
+            self._build_slide_prompt(
                 sections_md=section_md,
-                layout_rule=layout_rule,
+                layout_rule=layouts.get(section.section_type, layouts["content"]),
                 slide_info=f"Slide {i+1} of {total}",
-                context_md=all_sections_md,
             )
-            
-            section_images = self._filter_images([section], figure_images)
-            reference_images = []
-            if style_ref_image:
-                reference_images.append(style_ref_image)
-            reference_images.extend(section_images)
-            
-            image_data, mime_type = self._call_model(prompt, reference_images)
-            
-            # Save 2nd slide (i=1) as style reference
-            if i == 1:
-                style_ref_image = {
-                    "figure_id": "Reference Slide",
-                    "caption": "STRICTLY MAINTAIN: same background color, same accent color, same font style, same chart/icon style. Keep visual consistency.",
-                    "base64": base64.b64encode(image_data).decode("utf-8"),
-                    "mime_type": mime_type,
-                }
-            
-            generated_img = GeneratedImage(section_id=section.id, image_data=image_data, mime_type=mime_type)
-            results.append(generated_img)
-            
-            # Save immediately if callback provided
-            if save_callback:
-                save_callback(generated_img, i, total)
-        
-        # Generate remaining slides in parallel (from 3rd onwards)
-        if total > 2:
-            results_dict = {}
-            
-            def generate_single(i, section):
-                section_md = self._format_single_section_markdown(section, plan)
-                layout_rule = layouts.get(section.section_type, layouts["content"])
-                
-                prompt = self._build_slide_prompt(
-                    style_name=style_name,
-                    processed_style=processed_style,
-                    sections_md=section_md,
-                    layout_rule=layout_rule,
-                    slide_info=f"Slide {i+1} of {total}",
-                    context_md=all_sections_md,
-                )
-                
-                section_images = self._filter_images([section], figure_images)
-                reference_images = [style_ref_image] if style_ref_image else []
-                reference_images.extend(section_images)
-                
-                image_data, mime_type = self._call_model(prompt, reference_images)
-                return i, GeneratedImage(section_id=section.id, image_data=image_data, mime_type=mime_type)
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {
-                    executor.submit(generate_single, i, plan.sections[i]): i
-                    for i in range(2, total)
-                }
-                
-                for future in as_completed(futures):
-                    idx, generated_img = future.result()
-                    results_dict[idx] = generated_img
-                    
-                    # Save immediately if callback provided
-                    if save_callback:
-                        save_callback(generated_img, idx, total)
-            
-            # Append in order
-            for i in range(2, total):
-                results.append(results_dict[i])
-        
-        return results
+            for i, (section, section_md) in enumerate(zip(plan.sections, section_mds))
+        ]
+    
+    def _build_slide_request(self, i, plan, slide_prompts, figure_images, style_ref_image) -> tuple:
+        """Build (prompt, reference_images) for slide i; prompt is the part after the shared slide prefix."""
+        # The first (title) slide is always generated without a style reference
+        reference_images = [style_ref_image] if style_ref_image and i > 0 else []
+        reference_images.extend(self._filter_images([plan.sections[i]], figure_images))
+        return slide_prompts[i], reference_images
+    
+    def _load_style_reference(self, key: str) -> Optional[GeneratedImage]:
+        """Reference slide saved by an earlier run with the same slide prefix, if any."""
+        data = self._response_cache.get("style_refs", key)
+        if not data:
+            return None
+        mime_type, _, image_data = data.partition(b"\n")
+        logger.info("Reusing saved style reference slide")
+        return GeneratedImage(section_id="style_ref", image_data=image_data, mime_type=mime_type.decode("ascii"))
+    
+    def _store_style_reference(self, key: str, img: GeneratedImage):
+        self._response_cache.set("style_refs", key, img.mime_type.encode("ascii") + b"\n" + img.image_data)
+    
+    def _make_style_reference(self, img: GeneratedImage) -> dict:
+        """Wrap a generated slide as the style reference for subsequent slides."""
+        return {
+            "figure_id": "Reference Slide",
+            "caption": "STRICTLY MAINTAIN: same background color, same accent color, same font style, same chart/icon style. Keep visual consistency.",
+            "base64": img.b64,
+            "mime_type": img.mime_type,
+        }
     
     def _format_custom_style_for_poster(self, ps: ProcessedStyle) -> str:
         """Format ProcessedStyle into style hints string for poster."""
@@ -286,36 +584,40 @@ class ImageGenerator:
         
         return "\n\n".join(parts)
     
-    def _build_slide_prompt(self, style_name, processed_style: Optional[ProcessedStyle], sections_md, layout_rule, slide_info, context_md) -> str:
-        """Build prompt for slide with layout rules and consistency."""
+    def _build_slide_prefix(self, style_name, processed_style: Optional[ProcessedStyle], context_md) -> str:
+        """Build the slide prompt part shared by every slide of a run (style, hints, full context)."""
         parts = [FORMAT_SLIDE]
         
         if style_name == "custom" and processed_style:
             parts.append(f"Style: {self._format_custom_style_for_slide(processed_style)}")
+            if processed_style.decorations:
+                parts.append(f"Decorations: {processed_style.decorations}")
         else:
             parts.append(SLIDE_STYLE_HINTS.get(style_name, SLIDE_STYLE_HINTS["academic"]))
         
-        # Add layout rule, then decorations if custom style
-        parts.append(layout_rule)
-        if style_name == "custom" and processed_style and processed_style.decorations:
-            parts.append(f"Decorations: {processed_style.decorations}")
-        
         parts.append(VISUALIZATION_HINTS)
         parts.append(CONSISTENCY_HINT)
         parts.append(SLIDE_FIGURE_HINT)
-        
-        parts.append(slide_info)
         parts.append(f"---\nFull presentation context:\n{context_md}")
-        parts.append(f"---\nThis slide content:\n{sections_md}")
         
         return "\n\n".join(parts)
     
-    def _format_sections_markdown(self, plan: ContentPlan) -> str:
-        """Format all sections as markdown."""
-        parts = []
-        for section in plan.sections:
-            parts.append(self._format_single_section_markdown(section, plan))
-        return "\n\n---\n\n".join(parts)
+    def _build_slide_prompt(self, sections_md, layout_rule, slide_info) -> str:
+        """Build the per-slide prompt part that follows the shared prefix."""
+        parts = [
+            f"---\nLayout:\n{layout_rule}",
+            slide_info,
+            f"---\nThis slide content:\n{sections_md}",
+        ]
+        return "\n\n".join(parts)
+    
+    def _format_section_markdowns(self, plan: ContentPlan) -> List[str]:
+        """Format each section as markdown, in plan order."""
+        return [self._format_single_section_markdown(section, plan) for section in plan.sections]
+    
+    def _format_sections_markdown(self, section_mds: List[str]) -> str:
+        """Join formatted sections into the full markdown."""
+        return "\n\n---\n\n".join(section_mds)
     
     def _format_single_section_markdown(self, section: Section, plan: ContentPlan) -> str:
         """Format a single section as markdown."""
@@ -342,37 +644,59 @@ class ImageGenerator:
     
     def _load_figure_images(self, plan: ContentPlan, base_path: str) -> List[dict]:
         """Load figure images as base64."""
-        images = []
         mime_map = {
             ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
             ".png": "image/png", ".webp": "image/webp", ".gif": "image/gif"
         }
+        figures = list(plan.figures_index.items())
+        if not figures:
+            return []
         
-        for fig_id, fig in plan.figures_index.items():
-            if base_path:
-                img_path = Path(base_path) / fig.image_path
-            else:
-                img_path = Path(fig.image_path)
-            
-            if not img_path.exists():
-                continue
-            
-            mime_type = mime_map.get(img_path.suffix.lower(), "image/jpeg")
-            
-            try:
-                with open(img_path, "rb") as f:
-                    img_data = base64.b64encode(f.read()).decode("utf-8")
-                images.append({
-                    "figure_id": fig_id,
-                    "caption": fig.caption,
-                    "base64": img_data,
-                    "mime_type": mime_type,
-                })
-            except Exception:
-                continue
+        # Figures that point at the same file share one read and one base64 string,
+        # so every slide referencing them reuses the same payload
+        fig_paths = [
+            (fig_id, fig, Path(base_path) / fig.image_path if base_path else Path(fig.image_path))
+            for fig_id, fig in figures
+        ]
+        unique_paths = list(dict.fromkeys(img_path for _, _, img_path in fig_paths))
+        
+        # Figure reads are independent I/O
+        with ThreadPoolExecutor(max_workers=min(8, len(unique_paths))) as executor:
+            encoded = dict(zip(
+                unique_paths,
+                executor.map(lambda img_path: self._read_figure(img_path, mime_map), unique_paths),
+            ))
         
+        images = []
+        for fig_id, fig, img_path in fig_paths:
+            if encoded[img_path] is None:
+                continue
+            img_data, mime_type = encoded[img_path]
+            images.append({
+                "figure_id": fig_id,
+                "caption": fig.caption,
+                "base64": img_data,
+                "mime_type": mime_type,
+            })
         return images
     
+    def _read_figure(self, img_path: Path, mime_map: dict) -> Optional[tuple]:
+        """Read one figure as (base64, mime_type), or None if it is missing or unreadable."""
+        if not img_path.exists():
+            return None
+        try:
+            downscaled = _downscale_figure(img_path)
+        except Exception as e:
+            logger.debug(f"Sending {img_path.name} at full size: {e}")
+            downscaled = None
+        if downscaled:
+            image_data, mime_type = downscaled
+            return base64.b64encode(image_data).decode("ascii"), mime_type
+        try:
+            return _encode_file_base64(img_path), mime_map.get(img_path.suffix.lower(), "image/jpeg")
+        except Exception:
+            return None
+    
     def _filter_images(self, sections: List[Section], figure_images: List[dict]) -> List[dict]:
         """Filter images used in given sections."""
         used_ids = set()
@@ -381,78 +705,211 @@ class ImageGenerator:
                 used_ids.add(ref.figure_id)
         return [img for img in figure_images if img.get("figure_id") in used_ids]
     
-    def _call_model(self, prompt: str, reference_images: List[dict]) -> tuple:
-        """Call the image generation model with retry logic."""
-        logger = logging.getLogger(__name__)
-        content = [{"type": "text", "text": prompt}]
+    def _build_message_content(self, prompt: str, reference_images: List[dict], prefix: Optional[str] = None) -> List[dict]:
+        """Build the multimodal message content: [cacheable prefix,] prompt, then labelled images."""
+        content = []
+        if prefix:
+            # Identical across a run's slides, so it leads the message where prefix caches can match it
+            prefix_part = {"type": "text", "text": prefix}
+            if self._mark_cacheable_prefix:
+                prefix_part["cache_control"] = {"type": "ephemeral"}
+            content.append(prefix_part)
+        content.append({"type": "text", "text": prompt})
         
         # Add each image with figure_id and caption label
         for img in reference_images:
+            content.extend(self._image_content_blocks(img))
+        return content
+    
+    def _image_content_blocks(self, img: dict) -> List[dict]:
+        """Label and image_url blocks for a reference image, built once and reused by every slide."""
+        blocks = img.get("_content_blocks")
+        if blocks is None:
+            blocks = []
             if img.get("base64") and img.get("mime_type"):
                 fig_id = img.get("figure_id", "Figure")
                 caption = img.get("caption", "")
                 label = f"[{fig_id}]: {caption}" if caption else f"[{fig_id}]"
-                content.append({"type": "text", "text": label})
-                content.append({
+                blocks.append({"type": "text", "text": label})
+                blocks.append({
                     "type": "image_url",
                     "image_url": {"url": f"data:{img['mime_type']};base64,{img['base64']}"}
                 })
+            # Benign race: concurrent workers build identical blocks
+            img["_content_blocks"] = blocks
+        return blocks
+    
+    def _extract_image(self, response) -> tuple:
+        """Return (image_data, mime_type) from the API response, or raise RuntimeError."""
+        if response is None:
+            raise RuntimeError("API returned None response - possible rate limit or API error")
+        
+        if not hasattr(response, 'choices') or not response.choices:
+            raise RuntimeError(f"API response has no choices: {response}")
+        
+        message = response.choices[0].message
+        if hasattr(message, 'images') and message.images:
+            image_url = message.images[0]['image_url']['url']
+            if image_url.startswith('data:'):
+                header, base64_data = image_url.split(',', 1)
+                mime_type = header.split(':')[1].split(';')[0]
+                return base64.b64decode(base64_data), mime_type
+        
+        raise RuntimeError("Image generation failed - no images in response")
+    
+    async def _request_image_streamed(self, content: List[dict]) -> tuple:
+        """Request one image with stream=True, decoding its data URL chunk by chunk."""
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": content}],
+            stream=True,
+            extra_body={"modalities": ["image", "text"]},
+        )
+        self._limiter.update_from_headers(stream.response.headers)
+        decoder = _DataUrlDecoder()
+        async with stream:
+            async for chunk in stream:
+                for choice in chunk.choices:
+                    for image in getattr(choice.delta, "images", None) or []:
+                        # Only the first image is used; later ones start a new data URL
+                        if image.get("index", 0) == 0:
+                            decoder.feed(image["image_url"]["url"])
+        return decoder.result()
+    
+    async def _run_batch_slides(self, requests: List[tuple]) -> dict:
+        """Run slide requests as one Batch API job and return {custom_id: (image_data, mime_type)} for the ones that succeeded."""
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [{"role": "user", "content": content}],
+                    "modalities": ["image", "text"],
+                },
+            })
+            for custom_id, content in requests
+        ]
+        client = self.async_client
+        input_file = await client.files.create(file=("slides.jsonl", b"\n".join(lines)), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        logger.info(f"Submitted batch {batch.id} with {len(requests)} slides")
         
-        # Retry logic for API calls
-        max_retries = 3
-        retry_delay = 2  # seconds
+        delay = BATCH_POLL_INITIAL
+        while batch.status in _BATCH_ACTIVE_STATES:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX)
+            batch = await client.batches.retrieve(batch.id)
+        if batch.status != "completed" or not batch.output_file_id:
+            raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
         
-        for attempt in range(max_retries):
+        output = await client.files.content(batch.output_file_id)
+        images = {}
+        for line in output.content.splitlines():
+            if not line.strip():
+                continue
+            entry = orjson.loads(line)
+            custom_id = entry.get("custom_id")
+            response = entry.get("response") or {}
             try:
-                logger.info(f"Calling image generation API (attempt {attempt + 1}/{max_retries})...")
-                
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": content}],
-                    extra_body={"modalities": ["image", "text"]}
-                )
-                
-                # Check if response is valid
-                if response is None:
-                    error_msg = "API returned None response - possible rate limit or API error"
-                    logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (attempt + 1))
-                        continue
-                    raise RuntimeError(error_msg)
-                
-                if not hasattr(response, 'choices') or not response.choices:
-                    error_msg = f"API response has no choices: {response}"
-                    logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
-                    if attempt < max_retries - 1:
-                        time.sleep(retry_delay * (attempt + 1))
-                        continue
-                    raise RuntimeError(error_msg)
-                
-                message = response.choices[0].message
-                if hasattr(message, 'images') and message.images:
-                    image_url = message.images[0]['image_url']['url']
-                    if image_url.startswith('data:'):
-                        header, base64_data = image_url.split(',', 1)
-                        mime_type = header.split(':')[1].split(';')[0]
-                        logger.info("Image generation successful")
-                        return base64.b64decode(base64_data), mime_type
-                
-                error_msg = "Image generation failed - no images in response"
-                logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                raise RuntimeError(error_msg)
-                
+                if response.get("status_code") != 200:
+                    raise RuntimeError(entry.get("error") or response.get("body"))
+                images[custom_id] = self._extract_image(ChatCompletion.model_validate(response["body"]))
             except Exception as e:
-                logger.error(f"Error in API call (attempt {attempt + 1}/{max_retries}): {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay * (attempt + 1))
-                    continue
-                raise
+                logger.error(f"Batch slide {custom_id} failed: {e}")
+        return images
+    
+    def _estimate_tokens(self, prompt: str, reference_images: List[dict], prefix: Optional[str]) -> int:
+        """Rough input size for rate limiting: ~4 chars per token, ~1K tokens per image."""
+        return (len(prompt) + len(prefix or "")) // 4 + 1024 * len(reference_images)
+    
+    def _image_cache_key(self, prompt: str, reference_images: List[dict], prefix: Optional[str]) -> str:
+        """Exact-match key over the model, prompt text and full reference image contents."""
+        parts = [self.model, prefix or "", prompt]
+        for img in reference_images:
+            digest = img.get("_sha256")
+            if digest is None:
+                digest = hashlib.sha256(img.get("base64", "").encode("ascii")).hexdigest()
+                img["_sha256"] = digest
+            parts.extend((img.get("figure_id", ""), img.get("caption", ""), img.get("mime_type", ""), digest))
+        return ResponseCache.make_key(*parts)
+    
+    def _load_cached_image(self, cache_key: Optional[str]) -> Optional[tuple]:
+        if not cache_key:
+            return None
+        data = self._response_cache.get("images", cache_key)
+        if not data:
+            return None
+        mime_type, _, image_data = data.partition(b"\n")
+        logger.info("Using cached image for identical request")
+        return image_data, mime_type.decode("ascii")
+    
+    def _store_cached_image(self, cache_key: Optional[str], result: tuple):
+        if cache_key:
+            image_data, mime_type = result
+            self._response_cache.set("images", cache_key, mime_type.encode("ascii") + b"\n" + image_data)
+    
+    async def _call_model_async(self, prompt: str, reference_images: List[dict], prefix: Optional[str] = None) -> tuple:
+        """Call the image generation model with retry logic."""
+        cache_key = self._image_cache_key(prompt, reference_images, prefix) if self.cache_images else None
+        cached = await asyncio.to_thread(self._load_cached_image, cache_key)
+        if cached:
+            return cached
+        
+        content = self._build_message_content(prompt, reference_images, prefix)
+        tokens = self._estimate_tokens(prompt, reference_images, prefix)
         
-        raise RuntimeError("Image generation failed after all retry attempts")
+        for attempt in range(MAX_RETRIES):
+            self._breaker.before_call()
+            try:
+                await self._limiter.acquire_async(tokens)
+                logger.info(f"Calling image generation API (attempt {attempt + 1}/{MAX_RETRIES})...")
+                if self.stream_images:
+                    result = await self._request_image_streamed(content)
+                else:
+                    raw = await self.async_client.chat.completions.with_raw_response.create(
+                        model=self.model,
+                        messages=[{"role": "user", "content": content}],
+                        extra_body={"modalities": ["image", "text"]}
+                    )
+                    self._limiter.update_from_headers(raw.headers)
+                    result = self._extract_image(await raw.parse())
+                self._breaker.record_success()
+                logger.info("Image generation successful")
+                await asyncio.to_thread(self._store_cached_image, cache_key, result)
+                return result
+            except Exception as e:
+                self._limiter.update_from_headers(getattr(getattr(e, "response", None), "headers", None))
+                logger.error(f"Error in API call (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
+                # Only outages count towards the breaker; a 429, a rejected request or a reply
+                # without an image means the provider is up, so those go through normal backoff
+                if _is_outage(e):
+                    self._breaker.record_failure()
+                elif isinstance(e, (openai.APIStatusError, RuntimeError)):
+                    self._breaker.record_success()
+                if not _is_retryable(e):
+                    raise
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(_retry_delay(attempt))
+
+
+_generator: Optional[ImageGenerator] = None
+_generator_lock = threading.Lock()
+
+
+def get_image_generator() -> ImageGenerator:
+    """Shared ImageGenerator, so keep-alive connections are reused across runs."""
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            _generator = ImageGenerator()
+        return _generator
 
 
 def save_images_as_pdf(images: List[GeneratedImage], output_path: str):
@@ -465,27 +922,26 @@ def save_images_as_pdf(images: List[GeneratedImage], output_path: str):
     """
     from PIL import Image
     import io
+    from contextlib import ExitStack
     
-    pdf_images = []
+    if not images:
+        return
     
-    for img in images:
-        # Load image from bytes
+    def to_rgb(img: GeneratedImage):
+        # PDF has no alpha, so anything that is not already RGB is converted
         pil_img = Image.open(io.BytesIO(img.image_data))
-        
-        # Convert RGBA to RGB (PDF doesn't support alpha)
-        if pil_img.mode == 'RGBA':
-            pil_img = pil_img.convert('RGB')
-        elif pil_img.mode != 'RGB':
-            pil_img = pil_img.convert('RGB')
-        
-        pdf_images.append(pil_img)
+        if pil_img.mode == 'RGB':
+            return pil_img
+        with pil_img:
+            return pil_img.convert('RGB')
     
-    if pdf_images:
-        # Save first image and append the rest
-        pdf_images[0].save(
+    # PIL holds every page while writing; close them all once the PDF is saved
+    with ExitStack() as stack:
+        pages = [stack.enter_context(to_rgb(img)) for img in images]
+        pages[0].save(
             output_path,
             save_all=True,
-            append_images=pdf_images[1:] if len(pdf_images) > 1 else [],
+            append_images=pages[1:],
             resolution=100.0,
         )
-        print(f"PDF saved: {output_path}")
+    print(f"PDF saved: {output_path}")
@@ -0,0 +1,148 @@
+"""
+Rate limiting and circuit breaking for image generation requests
+"""
+import re
+import time
+import asyncio
+import threading
+from typing import Mapping, Optional
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit duration such as "1s", "6m0s", "20ms" or a bare number of seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets.
+
+    Callers reserve capacity before each request and wait out any deficit, so
+    parallel workers are spread over the window instead of bursting into 429s.
+    A limit of 0 disables that bucket. Rate-limit response headers pause all
+    callers until the provider's window resets.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _reserve(self, tokens: int) -> float:
+        """Take capacity for one request and return how long the caller must wait before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._paused_until - now)
+            if self.rpm:
+                self._requests -= 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests * 60 / self.rpm)
+            if self.tpm:
+                self._tokens -= min(tokens, self.tpm)
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens * 60 / self.tpm)
+            return wait
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request of roughly `tokens` tokens may be sent."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: int = 0):
+        """Async variant of acquire()."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers: Optional[Mapping[str, str]]):
+        """Adjust to the provider's view of the limits (retry-after / x-ratelimit-* headers)."""
+        if not headers:
+            return
+        pause = parse_duration(headers.get("retry-after"))
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        if remaining is not None and remaining.strip() == "0":
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests"))
+            pause = max(pause or 0.0, reset or 0.0)
+        with self._lock:
+            now = time.monotonic()
+            if remaining is not None and self.rpm:
+                try:
+                    self._refill(now)
+                    self._requests = min(self._requests, float(remaining))
+                except ValueError:
+                    pass
+            if pause:
+                self._paused_until = max(self._paused_until, now + pause)
+
+
+class ProviderUnavailable(RuntimeError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fail fast while the image provider keeps failing.
+
+    After fail_max consecutive transient failures the breaker opens and every
+    request is rejected with ProviderUnavailable for reset_timeout seconds. It
+    then lets a single trial request through (half-open): success closes it
+    again, failure re-opens it for another reset_timeout.
+    """
+
+    def __init__(self, fail_max: int = 5, reset_timeout: float = 30.0):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise ProviderUnavailable unless a request may be sent now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset_timeout - now
+            if remaining > 0:
+                raise ProviderUnavailable(
+                    f"image provider unavailable after {self._failures} consecutive failures; "
+                    f"retry in {remaining:.0f}s"
+                )
+            # This caller is the half-open trial; everyone else keeps waiting until it
+            # reports back (or another reset_timeout passes without a report)
+            self._opened_at = now
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
@@ -8,7 +8,11 @@ from .query import (
     SKIP_LLM_SECTIONS,
     GENERAL_OVERVIEW_QUERIES,
     get_queries,
+    get_unique_queries,
+    normalize_query,
     generate_general_queries,
+    batch_query_section,
+    semantic_batch_query,
 )
 
 __all__ = [
@@ -20,5 +24,9 @@ __all__ = [
     "SKIP_LLM_SECTIONS",
     "GENERAL_OVERVIEW_QUERIES",
     "get_queries",
+    "get_unique_queries",
+    "normalize_query",
     "generate_general_queries",
+    "batch_query_section",
+    "semantic_batch_query",
 ]
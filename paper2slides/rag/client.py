@@ -5,6 +5,7 @@ Document parsing, indexing, and querying for slide/poster generation.
 
 import sys
 import asyncio
+import functools
 from pathlib import Path
 from typing import Optional, Dict, Any, List, Callable
 
@@ -15,6 +16,7 @@ from lightrag.llm.openai import openai_complete_if_cache, openai_embed
 from lightrag.utils import EmbeddingFunc
 
 from .config import RAGConfig
+from .query import normalize_query
 
 
 class RAGClient:
@@ -269,6 +271,8 @@ class RAGClient:
         mode: str = "mix",
         system_prompt: Optional[str] = None,
         vlm_enhanced: Optional[bool] = None,
+        max_tokens: Optional[int] = None,
+        stop: Optional[List[str]] = None,
         **kwargs,
     ) -> str:
         """
@@ -282,12 +286,19 @@ class RAGClient:
             vlm_enhanced: If True, parse image paths in retrieved context and replace
                          with base64 encoded images for VLM processing.
                          Default: True when vision_model_func is available.
+            max_tokens: Cap on the generated answer, in tokens.
+            stop: Stop sequences for the generated answer.
             **kwargs: Other query parameters passed to QueryParam
-                     (top_k, max_tokens, temperature, etc.)
+                     (top_k, temperature, etc.)
         """
         if not self._initialized:
             await self.initialize()
         
+        limits = {k: v for k, v in (("max_tokens", max_tokens), ("stop", stop)) if v}
+        if limits:
+            # Per-query model override; the vision func also serves plain-text prompts
+            kwargs["model_func"] = functools.partial(self._create_vision_func(), **limits)
+        
         return await self._get_rag().aquery(
             question,
             mode=mode,
@@ -296,6 +307,10 @@ class RAGClient:
             **kwargs,
         )
     
+    async def embed(self, texts: List[str]):
+        """Embed texts with the index's embedding model."""
+        return await self._create_embedding_func().func(texts)
+    
     async def batch_query(
         self,
         questions: List[str],
@@ -347,6 +362,8 @@ class RAGClient:
         
         All queries across all categories are executed concurrently (up to max_concurrency).
         When one query finishes, the next one starts immediately regardless of category.
+        Queries that normalize to the same text and run in the same mode are sent once
+        and the answer is shared by every category that asked it.
         
         Args:
             queries_by_category: Queries organized by category {category: [queries]}
@@ -357,14 +374,23 @@ class RAGClient:
         """
         semaphore = asyncio.Semaphore(max_concurrency)
         
-        async def query_one(category: str, idx: int, q: str, mode: str) -> tuple:
+        shared: Dict[tuple, asyncio.Task] = {}
+        
+        async def run_query(q: str, mode: str) -> Dict[str, Any]:
             """Execute a single query with semaphore control."""
             async with semaphore:
                 try:
                     answer = await self.query(q, mode=mode, **kwargs)
-                    return (category, idx, {"query": q, "answer": answer, "mode": mode, "success": True})
+                    return {"answer": answer, "success": True}
                 except Exception as e:
-                    return (category, idx, {"query": q, "answer": None, "mode": mode, "success": False, "error": str(e)})
+                    return {"answer": None, "success": False, "error": str(e)}
+        
+        async def query_one(category: str, idx: int, q: str, mode: str) -> tuple:
+            key = (normalize_query(q), mode)
+            if key not in shared:
+                shared[key] = asyncio.ensure_future(run_query(q, mode))
+            outcome = await shared[key]
+            return (category, idx, {"query": q, "mode": mode, **outcome})
         
         # Flatten all queries into a single list of tasks
         tasks = []
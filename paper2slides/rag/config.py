@@ -183,6 +183,11 @@ class RAGConfig:
     verbose: bool = field(
         default_factory=lambda: os.getenv("VERBOSE", "false").lower() == "true"
     )
+    enable_semantic_cache: bool = field(
+        default_factory=lambda: os.getenv("RAG_SEMANTIC_CACHE", "false").lower() == "true"
+    )
+    """Answer near-duplicate queries from earlier answers on the same index."""
+    semantic_cache_threshold: float = 0.92
     
     @classmethod
     def from_env(cls) -> "RAGConfig":
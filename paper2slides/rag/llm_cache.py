@@ -0,0 +1,30 @@
+"""
+On-disk cache for the LLM calls made while building RAG queries
+"""
+import os
+import functools
+from pathlib import Path
+
+from ..utils.response_cache import ResponseCache
+
+
+@functools.lru_cache(maxsize=1)
+def get_llm_cache() -> ResponseCache:
+    """Process-wide LLM response cache. P2S_LLM_CACHE=0 or P2S_RESPONSE_CACHE=0 disables it."""
+    enabled = os.getenv("P2S_LLM_CACHE", "1") != "0" and os.getenv("P2S_RESPONSE_CACHE", "1") != "0"
+    return ResponseCache(enabled=enabled)
+
+
+def index_fingerprint(storage_dir: str) -> str:
+    """Identify the current state of a RAG index, so answers cached before a re-index are not reused."""
+    parts = [str(Path(storage_dir).resolve())]
+    try:
+        with os.scandir(storage_dir) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                # LightRAG's own response cache grows with every query and says nothing about the index
+                if entry.is_file() and "llm_response_cache" not in entry.name:
+                    st = entry.stat()
+                    parts.append(f"{entry.name}:{st.st_size}:{st.st_mtime_ns}")
+    except OSError:
+        pass
+    return ResponseCache.make_key(*parts)
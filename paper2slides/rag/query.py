@@ -1,4 +1,13 @@
-from typing import List, Dict, Union, Any, TYPE_CHECKING, TypedDict
+import re
+import json
+import asyncio
+import functools
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple, Union, Any, TYPE_CHECKING, TypedDict
+
+from .llm_cache import get_llm_cache, index_fingerprint
+from ..utils.llm_client import get_async_llm_client
+from ..utils.response_cache import ResponseCache
 
 if TYPE_CHECKING:
     from .client import RAGClient
@@ -13,7 +22,7 @@ class RAGQueryResult(TypedDict, total=False):
     error: str  # only present when success=False
 
 
-RAG_PAPER_QUERIES: Dict[str, List[str]] = {
+_RAG_PAPER_QUERIES: Dict[str, List[str]] = {
     "paper_info": [
         "List the paper title, author names and their institutional affiliations.",
     ],
@@ -71,9 +80,35 @@ RAG_PAPER_QUERIES: Dict[str, List[str]] = {
     ]
 }
 
-SKIP_LLM_SECTIONS = {"paper_info", "figures", "tables", "equations"}
+# Shared, read-only query schema: callers iterate it but never modify it
+RAG_PAPER_QUERIES: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+    {category: tuple(queries) for category, queries in _RAG_PAPER_QUERIES.items()}
+)
+
+_QUERY_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query: lowercased, whitespace collapsed, trailing punctuation stripped."""
+    return _QUERY_SPACE_RE.sub(" ", query.lower()).strip().rstrip("?.!;: ")
+
+
+def _build_canonical_queries() -> Dict[str, Tuple[str, List[str]]]:
+    canonical: Dict[str, Tuple[str, List[str]]] = {}
+    for category, queries in RAG_PAPER_QUERIES.items():
+        for query in queries:
+            _, sections = canonical.setdefault(normalize_query(query), (query, []))
+            if category not in sections:
+                sections.append(category)
+    return canonical
 
-RAG_QUERY_MODES: Dict[str, str] = {
+
+# normalized query -> (first original wording, sections it answers)
+_CANONICAL_QUERIES = _build_canonical_queries()
+
+SKIP_LLM_SECTIONS = frozenset({"paper_info", "figures", "tables", "equations"})
+
+RAG_QUERY_MODES: Mapping[str, str] = MappingProxyType({
     "paper_info": "hybrid",
     "figures": "mix",
     "tables": "mix",
@@ -82,7 +117,7 @@ RAG_QUERY_MODES: Dict[str, str] = {
     "solution": "mix",
     "results": "mix",
     "contributions": "mix",
-}
+})
 
 
 GENERAL_OVERVIEW_QUERIES = {
@@ -123,28 +158,69 @@ OUTPUT FORMAT (JSON only):
 
 Generate exactly {count} queries in this JSON format."""
 
+# The overview is spliced between a head and tail that only depend on count
+_PROMPT_HEAD, _PROMPT_TAIL = _GENERATE_GENERAL_QUERIES_PROMPT.split("{overview}")
+
+
+@functools.lru_cache(maxsize=8)
+def _general_queries_prompt_parts(count: int) -> tuple:
+    return _PROMPT_HEAD.format(count=count), _PROMPT_TAIL.format(count=count)
+
 
 def _truncate_overview(overview: str, max_length: int = 6000) -> str:
     if len(overview) <= max_length:
         return overview
     return overview[:max_length] + "\n\n[Note: Overview truncated due to length]"
 
+_LEAD_NUM_RE = re.compile(r'^[\d]+[\.\)\-\s]+')
+
+
+def _find_json_array(text: str, start: int = 0) -> Optional[tuple]:
+    """Find the first balanced [...] at or after start, in one pass.
+    
+    Brackets inside JSON strings are ignored. Returns (array_text, end_index)
+    or None if no balanced array follows.
+    """
+    depth = 0
+    begin = -1
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '[':
+            if depth == 0:
+                begin = i
+            depth += 1
+        elif depth == 0:
+            continue
+        elif ch == ']':
+            depth -= 1
+            if depth == 0:
+                return text[begin:i + 1], i + 1
+        elif ch == '"':
+            in_string = True
+    return None
+
+
 def _parse_queries_from_response(text: str) -> List[str]:
     """Parse LLM response to extract query strings."""
-    import re
-    import json
-    
-    try:
-        json_match = re.search(r'```json\s*(\[.*?\])\s*```', text, re.DOTALL)
-        if not json_match:
-            json_match = re.search(r'\[.*\]', text, re.DOTALL)
-        
-        if json_match:
-            json_str = json_match.group(1) if json_match.lastindex else json_match.group(0)
+    # Take the first balanced array that is valid JSON (a fenced ```json block or a bare array)
+    pos = 0
+    while (found := _find_json_array(text, pos)) is not None:
+        json_str, pos = found
+        try:
             query_objects = json.loads(json_str)
+        except ValueError:
+            continue
+        if isinstance(query_objects, list):
             return [obj['query'] for obj in query_objects if isinstance(obj, dict) and 'query' in obj]
-    except (json.JSONDecodeError, ValueError, KeyError):
-        pass
     
     # Fallback: parse line by line
     queries = []
@@ -152,13 +228,73 @@ def _parse_queries_from_response(text: str) -> List[str]:
         line = line.strip()
         if not line:
             continue
-        q = re.sub(r'^[\d]+[\.\)\-\s]+', '', line).strip()
+        q = _LEAD_NUM_RE.sub('', line).strip()
         if q and ('?' in q or '？' in q or len(q) > 20):
             queries.append(q)
     
     return queries
 
-def generate_general_queries(
+class _QueryArrayStream:
+    """Pull {"query": ...} objects out of a JSON array as its text streams in.
+    
+    Scans each new chunk once, carrying bracket depth and string state across
+    chunks, and parses every object of the first top-level array as soon as
+    it closes. The full text is kept for caching and the line-based fallback.
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start = -1
+        self._found_any = False
+    
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+        text = self.text
+        found = []
+        for i in range(self._pos, len(text)):
+            if self.done:
+                break
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '[':
+                self._depth += 1
+            elif self._depth == 0:
+                continue
+            elif ch == '{':
+                if self._depth == 1:
+                    self._obj_start = i
+                self._depth += 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in ']}':
+                self._depth -= 1
+                if ch == '}' and self._depth == 1 and self._obj_start >= 0:
+                    try:
+                        obj = json.loads(text[self._obj_start:i + 1])
+                    except ValueError:
+                        obj = None
+                    if isinstance(obj, dict) and isinstance(obj.get('query'), str):
+                        found.append(obj['query'])
+                        self._found_any = True
+                    self._obj_start = -1
+                elif self._depth == 0 and self._found_any:
+                    self.done = True
+        self._pos = len(text)
+        return found
+
+
+async def generate_general_queries(
     rag_client: "RAGClient",
     overview: str,
     count: int = 20,
@@ -171,39 +307,125 @@ def generate_general_queries(
         overview: Document overview text
         count: Number of queries to generate
     """
-    from openai import OpenAI
-    
-    prompt = _GENERATE_GENERAL_QUERIES_PROMPT.format(
-        overview=_truncate_overview(overview),
-        count=count,
-    )
+    head, tail = _general_queries_prompt_parts(count)
+    prompt = f"{head}{_truncate_overview(overview)}{tail}"
     
     try:
         config = rag_client.config.api
         
-        client = OpenAI(
-            api_key=config.llm_api_key,
-            base_url=config.llm_base_url,
-        )
+        # Same model and prompt give the same queries, so re-runs skip the LLM call
+        cache = get_llm_cache()
+        cache_key = ResponseCache.make_key(config.llm_model, config.llm_base_url or "", prompt)
+        result = cache.get_json("general_queries", cache_key)
+        if result:
+            return _parse_queries_from_response(result)
+        
+        # Async, so the event loop keeps serving other pipelines during the call
+        client = get_async_llm_client(config.llm_api_key, config.llm_base_url)
         
-        response = client.chat.completions.create(
+        # Streamed, so each query is parsed as soon as its object closes
+        stream = _QueryArrayStream()
+        queries = []
+        response = await client.chat.completions.create(
             model=config.llm_model,
             messages=[{
                 "role": "user",
                 "content": prompt
-            }]
+            }],
+            stream=True,
         )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                queries.extend(stream.feed(chunk.choices[0].delta.content))
         
-        result = response.choices[0].message.content
+        result = stream.text
         if not result:
             return []
         
-        return _parse_queries_from_response(result)
+        if not queries:
+            queries = _parse_queries_from_response(result)
+        if queries:
+            cache.set_json("general_queries", cache_key, result)
+        return queries
         
     except Exception as e:
         print(f"[Error] Query generation failed: {e}")
         return []
 
+_BATCH_SECTION_PROMPT = """Answer each of the following questions using the retrieved context.
+Return only a JSON array of {count} objects with fields "id" (the question number) and "answer".
+
+{questions}"""
+
+
+def _parse_batched_answers(text: str) -> Dict[int, str]:
+    """Map question number -> answer from a batched reply's JSON array."""
+    pos = 0
+    while (found := _find_json_array(text, pos)) is not None:
+        json_str, pos = found
+        try:
+            items = json.loads(json_str)
+        except ValueError:
+            continue
+        if not isinstance(items, list):
+            continue
+        answers = {}
+        for item in items:
+            if isinstance(item, dict) and isinstance(item.get("answer"), str):
+                try:
+                    answers[int(item.get("id"))] = item["answer"]
+                except (TypeError, ValueError):
+                    continue
+        if answers:
+            return answers
+    return {}
+
+
+async def batch_query_section(
+    rag_client: "RAGClient",
+    section_key: str,
+) -> List[RAGQueryResult]:
+    """
+    Answer all predefined queries of one section with a single RAG query.
+    
+    The section's questions share one retrieval and one LLM call, and the
+    reply is split back per question. Questions the reply leaves out are
+    queried individually, so the result always has one entry per query.
+    
+    Args:
+        rag_client: RAG client to query
+        section_key: Key into RAG_PAPER_QUERIES
+    """
+    queries = RAG_PAPER_QUERIES[section_key]
+    mode = RAG_QUERY_MODES.get(section_key, "mix")
+    prompt = _BATCH_SECTION_PROMPT.format(
+        count=len(queries),
+        questions="\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1)),
+    )
+    
+    try:
+        answers = _parse_batched_answers(await rag_client.query(prompt, mode=mode) or "")
+    except Exception as e:
+        print(f"[Warning] Batched query for '{section_key}' failed: {e}")
+        answers = {}
+    
+    results: List[RAGQueryResult] = [
+        {"query": q, "answer": answers[i], "mode": mode, "success": True}
+        for i, q in enumerate(queries, 1) if answers.get(i)
+    ]
+    missing = [q for i, q in enumerate(queries, 1) if not answers.get(i)]
+    if missing:
+        results.extend(await rag_client.batch_query(missing, mode=mode))
+        order = {q: i for i, q in enumerate(queries)}
+        results.sort(key=lambda r: order[r["query"]])
+    return results
+
+
+# The overview only seeds query generation, so its sections are kept short;
+# capped answers are not reused as answers to generated queries
+OVERVIEW_MAX_SECTION_LENGTH = 2000
+
+
 async def get_general_overview(
     rag_client: "RAGClient",
     mode: str = "mix",
@@ -213,41 +435,153 @@ async def get_general_overview(
     
     overview_parts = []
     
-    for label, query in GENERAL_OVERVIEW_QUERIES.items():
-        try:
-            response = await rag_client.query(query, mode=mode)
+    # Answers are cached per index state, so re-runs on an unchanged index skip the queries
+    cache = get_llm_cache()
+    config = rag_client.config
+    index_key = index_fingerprint(config.storage.storage_dir)
+    
+    # Cap generation near the truncation length (~4 chars per token) instead of paying for text we cut
+    limits = {}
+    if max_section_length > 0:
+        limits = {"max_tokens": max_section_length // 4 + 32, "stop": ["\n\n\n"]}
+    
+    async def cached_query(query: str) -> str:
+        cache_key = ResponseCache.make_key(
+            config.api.llm_model, config.api.llm_base_url or "", index_key, mode, query, str(max_section_length)
+        )
+        response = cache.get_json("rag_overview", cache_key)
+        if response is None:
+            response = await rag_client.query(query, mode=mode, **limits)
             if response:
-                # Clean references first
-                response_cleaned = clean_references(response.strip())
-                if max_section_length > 0 and len(response_cleaned) > max_section_length:
-                    response_cleaned = response_cleaned[:max_section_length] + "..."
-                overview_parts.append(f"[{label}]\n{response_cleaned}")
-        except Exception as e:
-            print(f"[Warning] Overview query '{label}' failed: {e}")
+                cache.set_json("rag_overview", cache_key, response)
+        return response
+    
+    # The queries are independent, so run them together and assemble in label order
+    labels, queries = zip(*GENERAL_OVERVIEW_QUERIES.items())
+    responses = await asyncio.gather(
+        *(cached_query(query) for query in queries),
+        return_exceptions=True,
+    )
+    
+    # Capped answers are fine for an overview but would be served as full answers
+    if rag_client.config.enable_semantic_cache and max_section_length <= 0:
+        answered = [(q, r) for q, r in zip(queries, responses) if r and not isinstance(r, Exception)]
+        if answered:
+            try:
+                await _remember_answers(rag_client, answered, mode)
+            except Exception as e:
+                print(f"[Warning] Could not update semantic query cache: {e}")
+    
+    for label, response in zip(labels, responses):
+        if isinstance(response, Exception):
+            print(f"[Warning] Overview query '{label}' failed: {response}")
             continue
+        if response:
+            # Clean references first; the slice is only a safety net now that generation is capped
+            response_cleaned = clean_references(response.strip())
+            if max_section_length > 0 and len(response_cleaned) > max_section_length:
+                response_cleaned = response_cleaned[:max_section_length] + "..."
+            overview_parts.append(f"[{label}]\n{response_cleaned}")
     
     if not overview_parts:
         raise ValueError("Failed to get any document overview information.")
     
     return "\n\n".join(overview_parts)
 
+async def _remember_answers(rag_client: "RAGClient", answered: List[tuple], mode: str):
+    """Add (query, answer) pairs to the semantic cache for this index."""
+    from .semantic_cache import SemanticQueryCache
+    
+    cache = SemanticQueryCache(rag_client, mode, rag_client.config.semantic_cache_threshold)
+    vectors = await cache.embed([q for q, _ in answered])
+    for (query, answer), vector in zip(answered, vectors):
+        if cache.lookup(vector) is None:
+            cache.add(query, vector, answer)
+    cache.save()
+
+
+async def semantic_batch_query(
+    rag_client: "RAGClient",
+    queries: List[str],
+    mode: str = "mix",
+) -> List[RAGQueryResult]:
+    """
+    rag_client.batch_query that answers near-duplicate queries from earlier answers.
+    
+    A query whose embedding is within the configured cosine threshold of an
+    already answered query on the same index (from this batch, the overview or
+    an earlier run) reuses that answer. Falls back to a plain batch_query when
+    the semantic cache is disabled or embedding fails.
+    """
+    if not rag_client.config.enable_semantic_cache or not queries:
+        return await rag_client.batch_query(queries, mode=mode)
+    
+    from .semantic_cache import SemanticQueryCache
+    
+    try:
+        cache = SemanticQueryCache(rag_client, mode, rag_client.config.semantic_cache_threshold)
+        vectors = await cache.embed(queries)
+    except Exception as e:
+        print(f"[Warning] Semantic query cache unavailable: {e}")
+        return await rag_client.batch_query(queries, mode=mode)
+    
+    results: List[Optional[RAGQueryResult]] = [None] * len(queries)
+    to_run: List[int] = []    # queries to send
+    aliases: Dict[int, int] = {}  # near-duplicate within this batch -> the query it follows
+    for i, query in enumerate(queries):
+        cached = cache.lookup(vectors[i])
+        if cached is not None:
+            results[i] = {"query": query, "answer": cached, "mode": mode, "success": True}
+            continue
+        twin = next((j for j in to_run if float(vectors[j] @ vectors[i]) >= cache.threshold), None)
+        if twin is None:
+            to_run.append(i)
+        else:
+            aliases[i] = twin
+    
+    if len(to_run) < len(queries):
+        print(f"[Info] Semantic cache answered {len(queries) - len(to_run)}/{len(queries)} queries")
+    
+    answered = await rag_client.batch_query([queries[i] for i in to_run], mode=mode)
+    for i, result in zip(to_run, answered):
+        results[i] = result
+        if result.get("success") and result.get("answer"):
+            cache.add(queries[i], vectors[i], result["answer"])
+    for i, twin in aliases.items():
+        results[i] = {**results[twin], "query": queries[i]}
+    
+    cache.save()
+    return results
+
+
+def get_unique_queries() -> Dict[str, List[str]]:
+    """
+    Predefined paper queries with duplicates folded together.
+    
+    Returns:
+        Mapping of query -> section keys it answers, one entry per distinct query
+    """
+    return {query: list(sections) for query, sections in _CANONICAL_QUERIES.values()}
+
+
 async def get_queries(
     rag_client: "RAGClient" = None,
     use_predefined_paper_queries: bool = True,
     count: int = 8,
-) -> Union[Dict[str, List[Dict[str, Any]]], List[str]]:
+    max_section_length: int = OVERVIEW_MAX_SECTION_LENGTH,
+) -> Union[Mapping[str, Tuple[str, ...]], List[str]]:
     """
     Get queries for document analysis.
     
     Returns:
-        If use_predefined_paper_queries=True: Dict with query configs
+        If use_predefined_paper_queries=True: Read-only mapping of category -> queries
         Otherwise: List of query strings
     """
     if use_predefined_paper_queries:
-        return RAG_PAPER_QUERIES.copy()
+        return RAG_PAPER_QUERIES
     
     if rag_client is None:
         raise ValueError("RAG client is required for dynamic query generation.")
     
-    overview = await get_general_overview(rag_client, mode="mix")
+    overview = await get_general_overview(rag_client, mode="mix", max_section_length=max_section_length)
     return await generate_general_queries(rag_client, overview, count)
@@ -0,0 +1,75 @@
+"""
+Embedding-similarity cache for RAG query answers
+"""
+import io
+from typing import List, Optional, TYPE_CHECKING
+
+from .llm_cache import get_llm_cache, index_fingerprint
+from ..utils.response_cache import ResponseCache
+
+if TYPE_CHECKING:
+    from .client import RAGClient
+
+
+class SemanticQueryCache:
+    """Answers to earlier queries on one RAG index, matched by cosine similarity.
+
+    Entries are persisted in the LLM cache under the index fingerprint and query
+    mode, so a re-index starts empty and P2S_LLM_CACHE=0 keeps it in-process.
+    """
+
+    def __init__(self, rag_client: "RAGClient", mode: str, threshold: float):
+        import numpy as np
+
+        self._np = np
+        self.rag_client = rag_client
+        self.threshold = threshold
+        self._key = ResponseCache.make_key(index_fingerprint(rag_client.config.storage.storage_dir), mode)
+        self.queries: List[str] = []
+        self.answers: List[str] = []
+        self.vectors = None  # (n, dim) L2-normalized
+        self._load()
+
+    def _load(self):
+        data = get_llm_cache().get("semantic_queries", self._key)
+        if not data:
+            return
+        try:
+            with self._np.load(io.BytesIO(data), allow_pickle=False) as saved:
+                self.queries = saved["queries"].tolist()
+                self.answers = saved["answers"].tolist()
+                self.vectors = saved["vectors"]
+        except (OSError, ValueError, KeyError):
+            self.queries, self.answers, self.vectors = [], [], None
+
+    def save(self):
+        if not self.queries:
+            return
+        buf = io.BytesIO()
+        self._np.savez(
+            buf,
+            queries=self._np.array(self.queries),
+            answers=self._np.array(self.answers),
+            vectors=self.vectors,
+        )
+        get_llm_cache().set("semantic_queries", self._key, buf.getvalue())
+
+    async def embed(self, texts: List[str]):
+        """L2-normalized embeddings of texts, one row each."""
+        vectors = self._np.asarray(await self.rag_client.embed(texts), dtype=self._np.float32)
+        norms = self._np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / self._np.maximum(norms, 1e-12)
+
+    def lookup(self, vector) -> Optional[str]:
+        """Answer of the most similar cached query, if it clears the threshold."""
+        if self.vectors is None or not len(self.vectors):
+            return None
+        sims = self.vectors @ vector
+        best = int(sims.argmax())
+        return self.answers[best] if sims[best] >= self.threshold else None
+
+    def add(self, query: str, vector, answer: str):
+        self.queries.append(query)
+        self.answers.append(answer)
+        row = vector[None, :]
+        self.vectors = row if self.vectors is None else self._np.vstack([self.vectors, row])
@@ -357,8 +357,10 @@ class QueryMixin:
             enhanced_prompt, query, system_prompt
         )
 
-        # 4. Call VLM for question answering
-        result = await self._call_vlm_with_multimodal_content(messages)
+        # 4. Call VLM for question answering, honouring a per-query model override
+        result = await self._call_vlm_with_multimodal_content(
+            messages, kwargs.get("model_func")
+        )
 
         self.logger.info("VLM enhanced query completed")
         return result
@@ -690,16 +692,20 @@ class QueryMixin:
             },
         ]
 
-    async def _call_vlm_with_multimodal_content(self, messages: List[Dict]) -> str:
+    async def _call_vlm_with_multimodal_content(
+        self, messages: List[Dict], vlm_func=None
+    ) -> str:
         """
         Call VLM to process multimodal content
 
         Args:
             messages: VLM message format
+            vlm_func: Optional replacement for vision_model_func
 
         Returns:
             str: VLM response result
         """
+        vlm_func = vlm_func or self.vision_model_func
         try:
             user_message = messages[1]
             content = user_message["content"]
@@ -707,12 +713,10 @@ class QueryMixin:
 
             if isinstance(content, str):
                 # Pure text mode
-                result = await self.vision_model_func(
-                    content, system_prompt=system_prompt
-                )
+                result = await vlm_func(content, system_prompt=system_prompt)
             else:
                 # Multimodal mode - pass complete messages directly to VLM
-                result = await self.vision_model_func(
+                result = await vlm_func(
                     "",  # Empty prompt since we're using messages format
                     messages=messages,
                 )
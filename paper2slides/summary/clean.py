@@ -4,28 +4,24 @@ Clean RAG results by removing references.
 import re
 from typing import Dict, List, Any
 
+# Block references: "### References" followed by list items
+_REFERENCE_BLOCK_RE = re.compile(r'###\s*References\s*\n(?:[-*]\s*\[[^\]]+\][^\n]*\n?)*', re.IGNORECASE)
+# Inline references: (Reference [1]) or (Reference [1], [2])
+_INLINE_REFERENCE_RE = re.compile(r'\s*\(Reference\s*\[[^\]]+\](?:\s*,\s*\[[^\]]+\])*\)', re.IGNORECASE)
+_EXTRA_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
 def clean_references(text: str) -> str:
     if not text:
         return text
     
-    # Remove block references: "### References" followed by list items
-    text = re.sub(
-        r'###\s*References\s*\n(?:[-*]\s*\[[^\]]+\][^\n]*\n?)*',
-        '',
-        text,
-        flags=re.IGNORECASE
-    )
+    # Remove block references
+    text = _REFERENCE_BLOCK_RE.sub('', text)
     
-    # Remove inline references: (Reference [1]) or (Reference [1], [2])
-    text = re.sub(
-        r'\s*\(Reference\s*\[[^\]]+\](?:\s*,\s*\[[^\]]+\])*\)',
-        '',
-        text,
-        flags=re.IGNORECASE
-    )
+    # Remove inline references
+    text = _INLINE_REFERENCE_RE.sub('', text)
     
     # Remove extra blank lines (more than 2 consecutive)
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = _EXTRA_BLANK_LINES_RE.sub('\n\n', text)
     
     return text.strip()
 
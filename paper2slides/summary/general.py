@@ -2,18 +2,23 @@
 General document processing
 Extract content from RAG results for general documents
 """
-from typing import List
-from dataclasses import dataclass, field
+import asyncio
+from typing import List, Dict, Any
+from dataclasses import dataclass, field, fields
 
 from .clean import clean_references
 from rag import RAGQueryResult
 
 
-@dataclass
+@dataclass(slots=True)
 class GeneralContent:
     """Extracted general document content."""
     content: str = ""
     raw_rag_results: List[RAGQueryResult] = field(default_factory=list)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
 
 
 EXTRACT_PROMPT = """You are organizing document content. Your task is to restructure the text while preserving ALL details.
@@ -105,7 +110,9 @@ async def extract_general(
     
     prompt = EXTRACT_PROMPT.format(content=merged)
     
-    response = llm_client.chat.completions.create(
+    # Sync client: run the completion in a worker thread so the event loop keeps running
+    response = await asyncio.to_thread(
+        llm_client.chat.completions.create,
         model=model,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=8000,
@@ -7,7 +7,7 @@ from typing import List, Optional, Dict, Any
 from pathlib import Path
 
 
-@dataclass
+@dataclass(slots=True)
 class TableInfo:
     """Information about an extracted table."""
     table_id: str           # e.g., "Table 1"
@@ -28,7 +28,7 @@ class TableInfo:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class FigureInfo:
     """Information about an extracted figure."""
     figure_id: str              # e.g., "Figure 1" (fallback generated if not found)
@@ -53,7 +53,7 @@ class FigureInfo:
         }
 
 
-@dataclass  
+@dataclass(slots=True)
 class OriginalElements:
     """
     Container for tables and figures extracted from original document.
@@ -67,6 +67,31 @@ class OriginalElements:
     figures: List[FigureInfo] = field(default_factory=list)
     base_path: str = ""
     
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OriginalElements":
+        """Rebuild from the "origin" dict stored in summary/plan checkpoints."""
+        return cls(
+            tables=[TableInfo(
+                table_id=t["id"],
+                caption=t.get("caption", ""),
+                html_content=t.get("html", ""),
+            ) for t in data.get("tables", [])],
+            figures=[FigureInfo(
+                figure_id=f["id"],
+                caption=f.get("caption"),
+                image_path=f.get("path", ""),
+            ) for f in data.get("figures", [])],
+            base_path=data.get("base_path", ""),
+        )
+    
+    def get_tables_index(self) -> Dict[str, TableInfo]:
+        """Get tables keyed by table_id."""
+        return {t.table_id: t for t in self.tables}
+    
+    def get_figures_index(self) -> Dict[str, FigureInfo]:
+        """Get figures keyed by figure_id."""
+        return {f.figure_id: f for f in self.figures}
+    
     def get_tables_markdown(self) -> str:
         """Get all tables as markdown, sorted by original position."""
         if not self.tables:
@@ -5,7 +5,7 @@ Extract structured content from RAG results for paper documents
 import re
 import asyncio
 from typing import Dict, Any, List, TypedDict, Set
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from pathlib import Path
 
 from .clean import clean_references
@@ -51,7 +51,7 @@ class RAGResults(TypedDict, total=False):
     contributions: List[RAGQueryResult]
 
 
-@dataclass
+@dataclass(slots=True)
 class PaperContent:
     """Extracted paper content."""
     paper_info: str = ""
@@ -65,6 +65,10 @@ class PaperContent:
     # Raw data
     raw_rag_results: Dict[str, Any] = field(default_factory=dict)
     
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+    
     def to_summary(
         self, 
         include_titles: bool = True,
@@ -235,6 +239,10 @@ async def extract_paper(
     return result
 
 
+# Image links: ![](images/xxx.jpg) or ![alt](path)
+_IMAGE_LINK_RE = re.compile(r'!\[.*?\]\(.*?\)')
+_EXTRA_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
 def _extract_text_from_markdown(md_path: str, max_chars: int = 3000) -> str:
     """
     Extract plain text from markdown file, removing image links.
@@ -247,11 +255,11 @@ def _extract_text_from_markdown(md_path: str, max_chars: int = 3000) -> str:
         with open(md_path, 'r', encoding='utf-8') as f:
             content = f.read(max_chars)
         
-        # Remove image links: ![](images/xxx.jpg) or ![alt](path)
-        content = re.sub(r'!\[.*?\]\(.*?\)', '', content)
+        # Remove image links
+        content = _IMAGE_LINK_RE.sub('', content)
         
         # Remove excessive blank lines
-        content = re.sub(r'\n{3,}', '\n\n', content)
+        content = _EXTRA_BLANK_LINES_RE.sub('\n\n', content)
         
         return content.strip()
     except Exception as e:
@@ -1,23 +1,32 @@
 """
 File and JSON utilities
 """
-import json
+import os
+import tempfile
 from pathlib import Path
 from typing import Any, Optional
 
+import orjson
+
 
 def save_json(path: Path, data: Any):
     """Save data to JSON file."""
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    # Write then rename, so concurrent readers never see a half-written file
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
 
 
 def load_json(path: Path) -> Optional[Any]:
     """Load data from JSON file."""
     if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return orjson.loads(path.read_bytes())
     return None
 
 
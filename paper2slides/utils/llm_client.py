@@ -0,0 +1,71 @@
+"""
+Shared LLM clients
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+# Enough pooled connections for the widest fan-out of any stage
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = httpx.Timeout(120.0)
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+
+
+@functools.lru_cache(maxsize=4)
+def get_llm_client(api_key: str, base_url: Optional[str] = None) -> OpenAI:
+    """Process-wide OpenAI client for (api_key, base_url), keeping its connection pool warm."""
+    return OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT),
+    )
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Pooled httpx client for the running event loop, shared by its AsyncOpenAI clients."""
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        http_client = clients.get("http")
+        if http_client is None:
+            http_client = httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT)
+            clients["http"] = http_client
+        return http_client
+
+
+async def close_async_clients():
+    """Close the pooled clients of the running event loop; call before the loop ends."""
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        clients = _async_clients.pop(loop, None)
+    if clients and "http" in clients:
+        await clients["http"].aclose()
+
+
+def get_async_llm_client(api_key: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+    """AsyncOpenAI client for (api_key, base_url) on the running event loop.
+
+    An async connection pool is bound to the loop it was opened on, and each
+    pipeline run gets its own loop, so clients are cached per loop and dropped
+    together with it.
+    """
+    http_client = get_async_http_client()
+    loop = asyncio.get_running_loop()
+    with _async_clients_lock:
+        clients = _async_clients[loop]
+        client = clients.get((api_key, base_url))
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+            clients[(api_key, base_url)] = client
+        return client
@@ -1,19 +1,48 @@
 """
 Logging utilities
 """
+import atexit
 import logging
+import logging.handlers
+import queue
 
 logger = logging.getLogger(__name__)
 
+_listener = None
+
+
+def _stop_listener():
+    """Flush queued records and stop the background log writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
 
 def setup_logging(level: int = logging.INFO):
-    """Configure logging with console output."""
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        datefmt='%H:%M:%S',
-        force=True
-    )
+    """Configure logging with console output.
+    
+    Records are queued and written to the console by a background thread,
+    so logging never blocks the caller (e.g. the API event loop) on stdout.
+    """
+    global _listener
+    _stop_listener()
+    
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%H:%M:%S'))
+    
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    
+    # Only merge args here; the console formatter adds time and level
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    logging.basicConfig(level=level, handlers=[queue_handler], force=True)
 
 
 def log_section(title: str):
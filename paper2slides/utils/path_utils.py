@@ -3,7 +3,7 @@ Path handling utilities
 """
 from pathlib import Path
 
-PREDEFINED_STYLES = {"academic", "doraemon"}
+PREDEFINED_STYLES = frozenset({"academic", "doraemon"})
 
 
 def normalize_input_path(input_path: str) -> str:
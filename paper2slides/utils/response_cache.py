@@ -0,0 +1,79 @@
+"""
+On-disk exact-match cache for model responses
+"""
+import os
+import hashlib
+import logging
+import functools
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Model responses stored one file per key under <root>/<namespace>/.
+
+    Keys are SHA-256 digests of the canonical request inputs, so a hit means the
+    exact same request was answered before. Set P2S_RESPONSE_CACHE=0 to disable.
+    """
+
+    def __init__(self, root: Optional[Path] = None, enabled: Optional[bool] = None):
+        self.root = Path(root or os.getenv("P2S_RESPONSE_CACHE_DIR") or Path.home() / ".paper2slides" / "cache")
+        self.enabled = enabled if enabled is not None else os.getenv("P2S_RESPONSE_CACHE", "1") != "0"
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Digest of the given str/bytes parts (length-prefixed, so parts cannot run together)."""
+        digest = hashlib.sha256()
+        for part in parts:
+            data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.root / namespace / key[:2] / key
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        try:
+            return self._path(namespace, key).read_bytes()
+        except OSError:
+            return None
+
+    def set(self, namespace: str, key: str, data: bytes):
+        if not self.enabled:
+            return
+        path = self._path(namespace, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write response cache entry {namespace}/{key[:12]}: {e}")
+
+    def get_json(self, namespace: str, key: str) -> Optional[Any]:
+        data = self.get(namespace, key)
+        if data is None:
+            return None
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return None
+
+    def set_json(self, namespace: str, key: str, value: Any):
+        self.set(namespace, key, orjson.dumps(value))
+
+
+@functools.lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache configured from the environment."""
+    return ResponseCache()
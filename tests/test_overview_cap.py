@@ -0,0 +1,110 @@
+"""
+Generation-time cap on overview answers
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("lightrag")
+pytest.importorskip("openai")
+
+from paper2slides.rag import query as rag_query
+from paper2slides.rag.client import RAGClient
+
+
+class _RecordingRAG:
+    """Stands in for RAGAnything: runs the per-query model override the way LightRAG would."""
+
+    def __init__(self):
+        self.query_kwargs = None
+
+    async def aquery(self, question, mode="mix", system_prompt=None, **kwargs):
+        self.query_kwargs = kwargs
+        model_func = kwargs.get("model_func")
+        return await model_func(question) if model_func else "default model"
+
+
+def test_query_limits_reach_model_func():
+    calls = []
+
+    async def vision_func(prompt, **kwargs):
+        calls.append(kwargs)
+        return "capped answer"
+
+    client = RAGClient()
+    client._initialized = True
+    client._rag = _RecordingRAG()
+    client._create_vision_func = lambda: vision_func
+
+    answer = asyncio.run(client.query("What is this?", max_tokens=532, stop=["\n\n\n"]))
+
+    assert answer == "capped answer"
+    assert calls == [{"max_tokens": 532, "stop": ["\n\n\n"]}]
+
+
+def test_query_without_limits_keeps_default_model():
+    client = RAGClient()
+    client._initialized = True
+    client._rag = _RecordingRAG()
+
+    assert asyncio.run(client.query("What is this?")) == "default model"
+    assert "model_func" not in client._rag.query_kwargs
+
+
+@pytest.fixture
+def no_llm_cache(monkeypatch):
+    monkeypatch.setenv("P2S_LLM_CACHE", "0")
+    rag_query.get_llm_cache.cache_clear()
+    yield
+    rag_query.get_llm_cache.cache_clear()
+
+
+def _overview_client(storage_dir):
+    seen = []
+
+    async def query(question, mode="mix", **kwargs):
+        seen.append(kwargs)
+        return "x" * 5000
+
+    config = SimpleNamespace(
+        storage=SimpleNamespace(storage_dir=str(storage_dir)),
+        api=SimpleNamespace(llm_model="test-model", llm_base_url=None),
+        enable_semantic_cache=False,
+    )
+    return SimpleNamespace(config=config, query=query), seen
+
+
+def test_overview_sends_cap_to_query(tmp_path, no_llm_cache):
+    client, seen = _overview_client(tmp_path)
+
+    overview = asyncio.run(rag_query.get_general_overview(client, max_section_length=2000))
+
+    assert len(seen) == len(rag_query.GENERAL_OVERVIEW_QUERIES)
+    assert all(kwargs == {"max_tokens": 532, "stop": ["\n\n\n"]} for kwargs in seen)
+    assert "x" * 2001 not in overview
+
+
+def test_overview_uncapped_by_default(tmp_path, no_llm_cache):
+    client, seen = _overview_client(tmp_path)
+
+    asyncio.run(rag_query.get_general_overview(client))
+
+    assert all(kwargs == {} for kwargs in seen)
+
+
+def test_capped_overview_does_not_seed_semantic_cache(tmp_path, no_llm_cache, monkeypatch):
+    client, _ = _overview_client(tmp_path)
+    client.config.enable_semantic_cache = True
+    remembered = []
+
+    async def remember(rag_client, answered, mode):
+        remembered.extend(answered)
+
+    monkeypatch.setattr(rag_query, "_remember_answers", remember)
+
+    asyncio.run(rag_query.get_general_overview(client, max_section_length=2000))
+    assert remembered == []
+
+    asyncio.run(rag_query.get_general_overview(client))
+    assert len(remembered) == len(rag_query.GENERAL_OVERVIEW_QUERIES)